@@ -0,0 +1,252 @@
+"""
+Content-addressed on-disk cache of downloaded attachments, indexed by attachment id and
+kept within a disk budget by evicting the least recently used unpinned files.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+INDEX_FILENAME = "index.json"
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AttachmentCache:
+    """Attachment files indexed by attachment id, stored by content hash, bounded by a disk budget"""
+
+    def __init__(self, directory: Path, max_bytes: int, save_delay: float = 1.0):
+        """
+        Args:
+            directory: Directory holding the cached files and the index
+            max_bytes: Budget for the summed size of the cached files (0 disables the cache)
+            save_delay: Seconds index changes are collected for before the index is written
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.directory / INDEX_FILENAME
+        # Ordered from least to most recently used
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serialises index writes so an older snapshot never replaces a newer one
+        self._write_lock = threading.Lock()
+        self.save_delay = save_delay
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        # path -> number of running jobs using the file
+        self._pins: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def temp_path(self, suffix: str = ".part") -> Path:
+        """A new unique path in the cache directory to download into"""
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=suffix)
+        os.close(fd)
+        return Path(path)
+
+    def lookup(self, attachment_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of the index entry for attachment_id, or None when it is not cached
+        or its file has gone missing. Counts a miss for None; hits are counted by touch().
+        The file of a returned entry is pinned, the caller must release() it.
+        """
+        with self._lock:
+            entry = self._entries.get(attachment_id)
+            if entry is not None and not Path(entry["path"]).is_file():
+                logger.warning(f"Cached file for attachment {attachment_id} is missing, dropping the entry")
+                self._entries.pop(attachment_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pin(entry["path"])
+            return dict(entry)
+
+    def touch(self, attachment_id: str):
+        """Record a cache hit, making the entry the most recently used"""
+        with self._lock:
+            entry = self._entries.get(attachment_id)
+            if entry is None:
+                return
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(attachment_id)
+            self.hits += 1
+            self._schedule_save()
+
+    def _pin(self, path: str):
+        # Callers must hold the lock
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def release(self, *paths: Optional[str]):
+        """Unpin files once the job using them is done, deleting those evicted in the meantime"""
+        with self._lock:
+            for path in paths:
+                if path is None or path not in self._pins:
+                    continue
+                self._pins[path] -= 1
+                if self._pins[path] == 0:
+                    del self._pins[path]
+                    # A disabled cache indexes nothing and leaves its files alone
+                    if self.enabled:
+                        self._delete_file_if_unused(path)
+            if self.enabled:
+                self._evict(keep=None)
+
+    def discard(self, attachment_id: str):
+        """Forget an entry, e.g. because its file failed verification"""
+        with self._lock:
+            entry = self._entries.pop(attachment_id, None)
+            if entry is not None:
+                self._delete_file_if_unused(entry["path"])
+                self._schedule_save()
+
+    def store(self, attachment_id: str, filename: str, temp_path: Path, sha256: str, size: int, etag: Optional[str] = None) -> str:
+        """
+        Move a downloaded file into the cache and index it.
+
+        Args:
+            attachment_id: Id of the attachment
+            filename: Original file name, kept as a suffix of the stored name
+            temp_path: Fully written download, from temp_path()
+            sha256: Digest of the file content
+            size: Size of the file in bytes
+            etag: ETag returned by the server, if any
+
+        Returns:
+            The path of the stored file, pinned before anything is evicted, the caller must release() it
+        """
+        # Only the base name is kept so an attachment name cannot point outside the directory
+        path = self.directory / f"{sha256[:16]}_{Path(filename).name}"
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._pin(str(path))
+            if not self.enabled:
+                return str(path)
+            previous = self._entries.pop(attachment_id, None)
+            self._entries[attachment_id] = {
+                "path": str(path),
+                "filename": filename,
+                "sha256": sha256,
+                "size": size,
+                "etag": etag,
+                "last_used": time.time(),
+            }
+            if previous is not None and previous["path"] != str(path):
+                self._delete_file_if_unused(previous["path"])
+            self._evict(keep=attachment_id)
+            self._schedule_save()
+        return str(path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": "attachments",
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "pinned": len(self._pins),
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _total_bytes(self) -> int:
+        # Callers must hold the lock; identical content shares one file
+        return sum({entry["path"]: entry["size"] for entry in self._entries.values()}.values())
+
+    def _evict(self, keep: Optional[str]):
+        # Callers must hold the lock. Pinned files stay, the cache may be over budget until they are released
+        while self._total_bytes() > self.max_bytes:
+            attachment_id = next((key for key, entry in self._entries.items() if key != keep and entry["path"] not in self._pins), None)
+            if attachment_id is None:
+                break
+            entry = self._entries.pop(attachment_id)
+            self._delete_file_if_unused(entry["path"])
+            self.evictions += 1
+            logger.info(f"Evicted attachment {attachment_id} ({entry['filename']}, {entry['size']} bytes) from the cache")
+
+    def _delete_file_if_unused(self, path: str):
+        # Callers must hold the lock
+        if path not in self._pins and all(entry["path"] != path for entry in self._entries.values()):
+            Path(path).unlink(missing_ok=True)
+
+    def _load(self):
+        if not self.index_path.is_file():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable attachment cache index {self.index_path}: {e}")
+            return
+
+        for attachment_id, entry in sorted(entries.items(), key=lambda item: item[1].get("last_used", 0)):
+            if Path(entry.get("path", "")).is_file():
+                self._entries[attachment_id] = entry
+        logger.info(f"Loaded {len(self._entries)} cached attachments from {self.index_path}")
+
+    def _schedule_save(self):
+        # Callers must hold the lock
+        self._dirty = True
+        if self._save_task is not None and not self._save_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop, e.g. a script, write straight away
+            self._dirty = False
+            self._write_index(json.dumps(self._entries))
+            return
+        self._save_task = loop.create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(self.save_delay)
+        with self._lock:
+            # Changes from here on schedule the next save
+            self._save_task = None
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        """Write the index if it has unsaved changes, e.g. on shutdown"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = json.dumps(self._entries)
+                self._dirty = False
+            self._write_index(snapshot)
+
+    def _write_index(self, snapshot: str):
+        # Written to a temp file first so a crash never leaves a partial index
+        temp_path = self.temp_path(suffix=".json")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark the token cost of the tool observation encodings used by the data search agent.
+
+Usage:
+    python bench_observation_encoding.py [results.json ...]
+
+Each optional JSON file holds a tool observation ({"status": ..., "data": [...]}) captured
+from execute_sql or describe_table. Without arguments representative results are generated.
+"""
+import json
+import sys
+from observation_encoding import ROW_ENCODERS, encode_observation
+from token_utils import count_tokens, tokenizer_name
+
+
+def sample_observations():
+    schema = {"status": "success", "data": [
+        {"COLUMN_NAME": name, "DATA_TYPE": dtype, "COLUMN_TYPE": ctype, "IS_NULLABLE": nullable,
+         "COLUMN_KEY": key, "COLUMN_DEFAULT": None, "EXTRA": "", "COLUMN_COMMENT": comment}
+        for name, dtype, ctype, nullable, key, comment in [
+            ("naptan_id", "varchar", "varchar(32)", "NO", "PRI", "NaPTAN identifier of the station"),
+            ("common_name", "varchar", "varchar(255)", "NO", "", "Display name"),
+            ("zone", "varchar", "varchar(8)", "YES", "", "Fare zone(s)"),
+            ("accepts_oyster", "tinyint", "tinyint(1)", "NO", "", "1 when Oyster cards are accepted"),
+            ("lat", "decimal", "decimal(9,6)", "YES", "", ""),
+            ("lon", "decimal", "decimal(9,6)", "YES", "", ""),
+            ("modes", "json", "json", "YES", "", "Transport modes serving the station"),
+            ("updated_at", "datetime", "datetime", "NO", "MUL", ""),
+        ]
+    ]}
+    rows = {"status": "success", "truncated": True,
+            "note": "Showing 50 rows, more rows not shown. Add filters to narrow the query.",
+            "data": [
+                {"naptan_id": f"940GZZLU{i:03d}", "common_name": f"Station {i} Underground Station",
+                 "zone": str(1 + i % 6), "accepts_oyster": i % 3 != 0, "lat": 51.5 + i / 1000,
+                 "lon": -0.12 - i / 1000, "modes": ["tube", "bus"] if i % 2 else ["tube"],
+                 "updated_at": "2025-06-01 12:00:00"}
+                for i in range(50)
+            ]}
+    return [("describe_table", "describe_table (8 columns)", schema), ("execute_sql", "execute_sql (50 rows x 8 columns)", rows)]
+
+
+def main():
+    observations = sample_observations()
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            observation = json.load(f)
+        tool_name = "execute_sql" if isinstance(observation.get("data"), list) and observation["data"] and "COLUMN_NAME" not in observation["data"][0] else "describe_table"
+        observations.append((tool_name, path, observation))
+
+    print(f"Tokenizer: {tokenizer_name()}\n")
+    print(f"{'observation':<36}{'format':<10}{'tokens':>8}{'saving':>9}")
+    for tool_name, label, observation in observations:
+        baseline = count_tokens(str(observation))
+        print(f"{label:<36}{'str()':<10}{baseline:>8}{'-':>9}")
+        for fmt in ROW_ENCODERS:
+            if fmt == "repr":
+                continue
+            tokens = count_tokens(encode_observation(tool_name, observation, fmt))
+            print(f"{'':<36}{fmt:<10}{tokens:>8}{(1 - tokens / baseline):>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
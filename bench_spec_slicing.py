@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark the prompt size of OpenAPI spec slicing.
+
+Usage:
+    python bench_spec_slicing.py [spec.json [collection.json]]
+
+Compares the indent=2 serialisation the prompts used to embed with the compact slice of
+every operation, the slice of a single operation (smallest, median and largest) and, when
+a Postman collection is given, the slice of the operations the collection exercises.
+Without arguments a representative spec with shared, nested components is generated.
+"""
+import json
+import statistics
+import sys
+from spec_slicing import HTTP_METHODS, collection_operations, dump_compact, slice_spec
+from token_utils import count_tokens, tokenizer_name
+
+
+def sample_spec(resources: int = 30):
+    schemas = {
+        "Error": {"type": "object", "properties": {"code": {"type": "integer"}, "message": {"type": "string"}}},
+        "Link": {"type": "object", "properties": {"rel": {"type": "string"}, "href": {"type": "string", "format": "uri"}}},
+        "Page": {"type": "object", "properties": {"offset": {"type": "integer"}, "limit": {"type": "integer"}, "total": {"type": "integer"},
+                                                   "links": {"type": "array", "items": {"$ref": "#/components/schemas/Link"}}}},
+    }
+    paths = {}
+    for i in range(resources):
+        name = f"Resource{i}"
+        schemas[name] = {
+            "type": "object",
+            "description": f"A {name} as returned by the API, with its audit fields and related links.",
+            "required": ["id", "name"],
+            "properties": {
+                "id": {"type": "string", "description": f"Identifier of the {name}"},
+                "name": {"type": "string", "maxLength": 255},
+                "status": {"type": "string", "enum": ["active", "suspended", "closed"]},
+                "createdAt": {"type": "string", "format": "date-time"},
+                "updatedAt": {"type": "string", "format": "date-time"},
+                "owner": {"$ref": f"#/components/schemas/Resource{(i + 1) % resources}Summary"},
+                "links": {"type": "array", "items": {"$ref": "#/components/schemas/Link"}},
+            },
+        }
+        schemas[f"{name}Summary"] = {"type": "object", "properties": {"id": {"type": "string"}, "name": {"type": "string"}}}
+        schemas[f"{name}List"] = {"type": "object", "properties": {
+            "page": {"$ref": "#/components/schemas/Page"},
+            "items": {"type": "array", "items": {"$ref": f"#/components/schemas/{name}"}}}}
+        error = {"description": "Error", "content": {"application/json": {"schema": {"$ref": "#/components/schemas/Error"}}}}
+        paths[f"/resource{i}"] = {
+            "get": {"operationId": f"list{name}", "summary": f"List {name} items", "tags": [name],
+                    "parameters": [{"$ref": "#/components/parameters/Offset"}, {"$ref": "#/components/parameters/Limit"}],
+                    "responses": {"200": {"description": "OK", "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{name}List"}}}}, "400": error}},
+            "post": {"operationId": f"create{name}", "summary": f"Create a {name}", "tags": [name],
+                     "requestBody": {"content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{name}"}}}},
+                     "responses": {"201": {"description": "Created", "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{name}"}}}}, "400": error}},
+        }
+        paths[f"/resource{i}/{{id}}"] = {
+            "parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}],
+            "get": {"operationId": f"get{name}", "summary": f"Get a {name}", "tags": [name],
+                    "responses": {"200": {"description": "OK", "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{name}"}}}}, "404": error}},
+            "delete": {"operationId": f"delete{name}", "summary": f"Delete a {name}", "tags": [name],
+                       "responses": {"204": {"description": "Deleted"}, "404": error}},
+        }
+    return {
+        "openapi": "3.0.3",
+        "info": {"title": "Sample API", "version": "1.0.0"},
+        "servers": [{"url": "https://api.example.com/v1"}],
+        "tags": [{"name": f"Resource{i}", "description": f"Operations on Resource{i}"} for i in range(resources)],
+        "paths": paths,
+        "components": {
+            "schemas": schemas,
+            "parameters": {
+                "Offset": {"name": "offset", "in": "query", "schema": {"type": "integer", "minimum": 0}},
+                "Limit": {"name": "limit", "in": "query", "schema": {"type": "integer", "maximum": 100}},
+                "Unused": {"name": "unused", "in": "header", "schema": {"type": "string"}},
+            },
+        },
+    }
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            spec = json.load(f)
+        label = sys.argv[1]
+    else:
+        spec = sample_spec()
+        label = "generated sample"
+
+    operations = [(method, template) for template, path_item in spec.get("paths", {}).items() for method in HTTP_METHODS if method in path_item]
+    baseline = count_tokens(json.dumps(spec, indent=2))
+
+    print(f"Tokenizer: {tokenizer_name()}")
+    print(f"Spec: {label} ({len(spec.get('paths', {}))} paths, {len(operations)} operations)\n")
+    print(f"{'prompt text':<44}{'tokens':>8}{'saving':>9}")
+
+    def report(name, tokens):
+        print(f"{name:<44}{tokens:>8}{(1 - tokens / baseline):>9.0%}")
+
+    print(f"{'indent=2 (previous prompt)':<44}{baseline:>8}{'-':>9}")
+    report("compact, whole spec", count_tokens(dump_compact(spec)))
+    report("compact slice, all operations", count_tokens(dump_compact(slice_spec(spec))))
+
+    single = sorted(count_tokens(dump_compact(slice_spec(spec, [operation]))) for operation in operations)
+    if single:
+        report("slice, one operation (smallest)", single[0])
+        report("slice, one operation (median)", int(statistics.median(single)))
+        report("slice, one operation (largest)", single[-1])
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            collection = json.load(f)
+        used = collection_operations(spec, collection)
+        report(f"slice, {len(used)} operations of the collection", count_tokens(dump_compact(slice_spec(spec, used))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+De-duplicating merge of generated tests into an existing Postman collection.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from spec_slicing import normalize_request_path, request_path, resolved_request_path
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+# "keep" adds a new request with different tests alongside the existing one, "replace" swaps it for an existing request of the same name
+COLLECTION_MERGE_POLICY = os.getenv("COLLECTION_MERGE_POLICY", "keep").lower()
+
+RequestKey = Tuple[str, str, str]  # (method, URL, header and body fingerprint)
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()[:16]
+
+
+def _enabled_pairs(entries: Any) -> List[Tuple[str, str]]:
+    return sorted(
+        (str(entry.get("key")), str(entry.get("value") if entry.get("value") is not None else ""))
+        for entry in entries or [] if isinstance(entry, dict) and entry.get("key") and not entry.get("disabled")
+    )
+
+
+def _url_key(request: Dict[str, Any]) -> str:
+    """
+    Path with its :name path variables resolved from url.variable, plus the sorted query so
+    parameter order does not matter. GET /stops/:id with id=123 and with id=unknown are
+    different requests.
+    """
+    url = request.get("url") or ""
+    if isinstance(url, dict):
+        query = _enabled_pairs(url.get("query")) if url.get("query") is not None else sorted(parse_qsl((url.get("raw") or "").partition("?")[2], keep_blank_values=True))
+    else:
+        query = sorted(parse_qsl(url.partition("?")[2], keep_blank_values=True))
+    path = resolved_request_path(request)
+    return f"/{path}?{'&'.join(f'{key}={value}' for key, value in query)}" if query else f"/{path}"
+
+
+def _placement_path(request: Dict[str, Any]) -> str:
+    """Path with Postman variables normalised, requests to the same endpoint go to the same folder"""
+    return "/" + normalize_request_path(request_path(request))
+
+
+def _body_fingerprint(request: Dict[str, Any]) -> str:
+    body = request.get("body") if isinstance(request.get("body"), dict) else {}
+    mode = body.get("mode")
+    if mode == "raw":
+        raw = body.get("raw") or ""
+        try:
+            # Formatting and key order of JSON bodies do not matter
+            content: Any = json.loads(raw)
+        except ValueError:
+            content = raw.strip()
+    elif mode in ("urlencoded", "formdata"):
+        content = _enabled_pairs(body.get(mode))
+    else:
+        content = body.get(mode) if mode else None
+    return _digest([_enabled_pairs(request.get("header")), mode, content])
+
+
+def _scripts_hash(item: Dict[str, Any]) -> str:
+    scripts = []
+    for event in item.get("event") or []:
+        if not isinstance(event, dict):
+            continue
+        script = (event.get("script") or {}).get("exec") or []
+        lines = [script] if isinstance(script, str) else script
+        # Whitespace only changes do not make a different test
+        scripts.append((event.get("listen"), " ".join(" ".join(str(line).split()) for line in lines).strip()))
+    return _digest(sorted(scripts))
+
+
+def item_keys(item: Dict[str, Any]) -> Optional[Tuple[RequestKey, str, str]]:
+    """(request key, test script hash, placement path) of a request item, None for folders and malformed items"""
+    request = item.get("request")
+    if not request:
+        return None
+    if isinstance(request, str):
+        request = {"url": request}
+    request_key = ((request.get("method") or "GET").upper(), _url_key(request), _body_fingerprint(request))
+    return request_key, _scripts_hash(item), _placement_path(request)
+
+
+class _Slot:
+    """Where an indexed request lives, so it can be replaced in place"""
+    __slots__ = ("items", "position", "name", "existing")
+
+    def __init__(self, items: List[Any], position: int, name: Any, existing: bool):
+        self.items = items
+        self.position = position
+        self.name = name
+        # Only requests of the existing collection are replaced, never other items of the same batch
+        self.existing = existing
+
+
+def _copy_tree(node: Dict[str, Any], folder: str, requests: Dict[RequestKey, Dict[str, _Slot]],
+               folders_by_path: Dict[str, Tuple[List[Any], str]], folders_by_segment: Dict[str, Tuple[List[Any], str]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Shallow copy of a collection or folder with its item lists copied, indexing the requests on the way
+
+    Returns:
+        The copy and the number of request items in it
+    """
+    count = 0
+    copied = dict(node)
+    items = list(node.get("item") or [])
+    copied["item"] = items
+    pending = [(copied, folder)]
+    # Folders are visited in collection order, appending to pending while iterating over it
+    for container, name in pending:
+        items = container["item"]
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            if isinstance(item.get("item"), list):
+                child = dict(item)
+                child["item"] = list(item["item"])
+                items[position] = child
+                pending.append((child, str(item.get("name") or "")))
+                continue
+            keys = item_keys(item)
+            if keys is None:
+                continue
+            count += 1
+            request_key, scripts_hash, path = keys
+            requests.setdefault(request_key, {}).setdefault(scripts_hash, _Slot(items, position, item.get("name"), existing=True))
+            # Folder placement hints, the first folder seen for a path or segment wins
+            folders_by_path.setdefault(f"{request_key[0]} {path}", (items, name))
+            folders_by_path.setdefault(path, (items, name))
+            folders_by_segment.setdefault(path.strip("/").split("/")[0], (items, name))
+    return copied, count
+
+
+def merge_collection_items(existing_collection: Dict[str, Any], new_items: List[Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Merge generated items into a collection without duplicating requests.
+
+    Args:
+        existing_collection: The Postman collection, not modified
+        new_items: Generated request items (or folders, which are added as they are)
+
+    Returns:
+        The merged collection and the merge statistics
+    """
+    requests: Dict[RequestKey, Dict[str, _Slot]] = {}
+    folders_by_path: Dict[str, Tuple[List[Any], str]] = {}
+    folders_by_segment: Dict[str, Tuple[List[Any], str]] = {}
+    merged, existing_count = _copy_tree(existing_collection, "", requests, folders_by_path, folders_by_segment)
+
+    stats: Dict[str, Any] = {"existing": existing_count, "received": len(new_items), "added": 0, "replaced": 0, "duplicates_dropped": 0, "folders": {}}
+    for item in new_items:
+        keys = item_keys(item) if isinstance(item, dict) else None
+        if keys is None:
+            merged["item"].append(item)
+            stats["added"] += 1
+            continue
+
+        request_key, scripts_hash, path = keys
+        slots = requests.get(request_key, {})
+        if scripts_hash in slots:
+            stats["duplicates_dropped"] += 1
+            continue
+        if slots and COLLECTION_MERGE_POLICY == "replace":
+            # An existing request with these parameters and the same name takes the new test scripts
+            old_hash = next((key for key, slot in slots.items() if slot.existing and slot.name == item.get("name")), None)
+            if old_hash is not None:
+                slot = slots.pop(old_hash)
+                slot.items[slot.position] = item
+                slot.existing = False
+                slots[scripts_hash] = slot
+                stats["replaced"] += 1
+                continue
+
+        items, folder = (
+            folders_by_path.get(f"{request_key[0]} {path}")
+            or folders_by_path.get(path)
+            or folders_by_segment.get(path.strip("/").split("/")[0])
+            or (merged["item"], "")
+        )
+        items.append(item)
+        # Later new items with the same request are duplicates of this one
+        requests.setdefault(request_key, {})[scripts_hash] = _Slot(items, len(items) - 1, item.get("name"), existing=False)
+        folders_by_path.setdefault(f"{request_key[0]} {path}", (items, folder))
+        stats["added"] += 1
+        if folder:
+            stats["folders"][folder] = stats["folders"].get(folder, 0) + 1
+
+    stats["total"] = existing_count + stats["added"]
+    logger.info(
+        f"Merged {stats['received']} generated items into {existing_count} requests: {stats['added']} added, "
+        f"{stats['replaced']} replaced, {stats['duplicates_dropped']} duplicates dropped"
+    )
+    return merged, stats
@@ -0,0 +1,245 @@
+"""
+Coverage index of a Postman collection against an OpenAPI spec, reported as a compact gap report.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+from pydantic import BaseModel, Field
+from spec_slicing import HTTP_METHODS, Operation, iter_request_items, match_operation, request_path, resolve_ref, resolved_request_path
+
+# ===== CONFIGURATION =====
+# Distinct values listed per exercised parameter in the report
+COVERAGE_MAX_VALUES = int(os.getenv("COVERAGE_MAX_VALUES", "8"))
+# Existing test names listed per operation in the report
+COVERAGE_MAX_TEST_NAMES = int(os.getenv("COVERAGE_MAX_TEST_NAMES", "40"))
+
+# Status codes in test script lines that mention the response status or code
+STATUS_LINE = re.compile(r"status|response\.code|responseCode", re.IGNORECASE)
+STATUS_CODE = re.compile(r"(?<![\d.])([1-5]\d\d)(?![\d.])")
+
+
+class OperationCoverage(BaseModel):
+    """What the collection tests of one spec operation"""
+    method: str
+    template: str
+    documented_statuses: List[str] = Field(default_factory=list)
+    documented_parameters: Dict[str, List[str]] = Field(default_factory=dict)  # "location:name" -> enum values
+    requests: int = 0
+    test_names: List[str] = Field(default_factory=list)
+    asserted_statuses: Set[str] = Field(default_factory=set)
+    parameter_values: Dict[str, List[str]] = Field(default_factory=dict)  # "location:name" -> distinct values sent
+
+
+class CoverageIndex(BaseModel):
+    operations: Dict[str, OperationCoverage] = Field(default_factory=dict)  # "METHOD template" -> coverage
+    unmatched: List[str] = Field(default_factory=list)  # "METHOD path: name" of requests outside the spec
+    total_requests: int = 0
+
+    def report(self) -> str:
+        """Compact coverage gap report for prompts"""
+        covered = sum(1 for operation in self.operations.values() if operation.requests)
+        lines = [f"{self.total_requests} requests cover {covered} of {len(self.operations)} operations in the spec."]
+
+        for key, operation in self.operations.items():
+            lines.append("")
+            if not operation.requests:
+                lines.append(f"{key}: NOT TESTED")
+                if operation.documented_statuses:
+                    lines.append(f"  documented statuses: {', '.join(operation.documented_statuses)}")
+                if operation.documented_parameters:
+                    lines.append(f"  parameters: {', '.join(_parameter_label(parameter) for parameter in operation.documented_parameters)}")
+                continue
+
+            lines.append(f"{key}: {operation.requests} requests")
+            if operation.asserted_statuses:
+                lines.append(f"  asserted statuses: {', '.join(sorted(operation.asserted_statuses))}")
+            never_asserted = [status for status in operation.documented_statuses if not _status_covered(status, operation.asserted_statuses)]
+            if never_asserted:
+                lines.append(f"  documented statuses never asserted: {', '.join(never_asserted)}")
+
+            exercised = []
+            for parameter, values in operation.parameter_values.items():
+                shown = ", ".join(json.dumps(value) for value in values[:COVERAGE_MAX_VALUES])
+                more = f" (+{len(values) - COVERAGE_MAX_VALUES} more)" if len(values) > COVERAGE_MAX_VALUES else ""
+                exercised.append(f"{_parameter_label(parameter)} = {shown}{more}")
+            if exercised:
+                lines.append(f"  parameters exercised: {'; '.join(exercised)}")
+
+            never_exercised = [parameter for parameter in operation.documented_parameters if parameter not in operation.parameter_values]
+            if never_exercised:
+                lines.append(f"  parameters never exercised: {', '.join(_parameter_label(parameter) for parameter in never_exercised)}")
+
+            unused_enums = []
+            for parameter, enum in operation.documented_parameters.items():
+                used = set(operation.parameter_values.get(parameter, []))
+                missing = [value for value in enum if value not in used]
+                if missing and parameter in operation.parameter_values:
+                    unused_enums.append(f"{_parameter_label(parameter)}: {', '.join(missing)}")
+            if unused_enums:
+                lines.append(f"  enum values never used: {'; '.join(unused_enums)}")
+
+            names = operation.test_names[:COVERAGE_MAX_TEST_NAMES]
+            more = f" (+{len(operation.test_names) - COVERAGE_MAX_TEST_NAMES} more)" if len(operation.test_names) > COVERAGE_MAX_TEST_NAMES else ""
+            lines.append(f"  existing tests: {'; '.join(names)}{more}")
+
+        if self.unmatched:
+            lines.append("")
+            lines.append(f"Requests not matching any spec operation: {'; '.join(self.unmatched[:COVERAGE_MAX_TEST_NAMES])}")
+        return "\n".join(lines)
+
+
+def _parameter_label(parameter: str) -> str:
+    location, name = parameter.split(":", 1)
+    return f"{name} ({location})"
+
+
+def _status_covered(documented: str, asserted: Set[str]) -> bool:
+    # Ranges such as 4XX are covered by any asserted status of the class, "default" by anything
+    if documented == "default":
+        return bool(asserted)
+    if documented.upper().endswith("XX"):
+        return any(status.startswith(documented[0]) for status in asserted)
+    return documented in asserted
+
+
+def _resolve(spec: Dict[str, Any], node: Any) -> Any:
+    # Follow a chain of $refs, bounded in case it is circular
+    for _ in range(16):
+        if not (isinstance(node, dict) and isinstance(node.get("$ref"), str)):
+            break
+        node = resolve_ref(spec, node["$ref"]) or {}
+    return node
+
+
+def _enum_values(spec: Dict[str, Any], schema: Any) -> List[str]:
+    schema = _resolve(spec, schema)
+    if not isinstance(schema, dict):
+        return []
+    if schema.get("type") == "array":
+        return _enum_values(spec, schema.get("items"))
+    return [str(value) for value in schema.get("enum") or []]
+
+
+def _documented_parameters(spec: Dict[str, Any], path_item: Dict[str, Any], operation: Dict[str, Any]) -> Dict[str, List[str]]:
+    parameters: Dict[str, List[str]] = {}
+    # Operation level parameters override path level ones of the same name and location
+    for parameter in (path_item.get("parameters") or []) + (operation.get("parameters") or []):
+        parameter = _resolve(spec, parameter)
+        if not isinstance(parameter, dict) or "name" not in parameter:
+            continue
+        # Swagger 2 keeps the enum on the parameter itself
+        parameters[f"{parameter.get('in', 'query')}:{parameter['name']}"] = _enum_values(spec, parameter.get("schema") or parameter)
+
+    # Top level properties of the first request body media type
+    request_body = _resolve(spec, operation.get("requestBody"))
+    content = list(((request_body or {}).get("content") or {}).values()) if isinstance(request_body, dict) else []
+    schema = _resolve(spec, (content[0] or {}).get("schema")) if content else None
+    if isinstance(schema, dict):
+        for name, property_schema in (schema.get("properties") or {}).items():
+            parameters[f"body:{name}"] = _enum_values(spec, property_schema)
+    return parameters
+
+
+def _asserted_statuses(item: Dict[str, Any]) -> Set[str]:
+    statuses = set()
+    for event in item.get("event") or []:
+        if not isinstance(event, dict) or event.get("listen") != "test":
+            continue
+        script = (event.get("script") or {}).get("exec") or []
+        for line in [script] if isinstance(script, str) else script:
+            if isinstance(line, str) and STATUS_LINE.search(line):
+                statuses.update(STATUS_CODE.findall(line))
+    return statuses
+
+
+def _sent_parameters(request: Dict[str, Any], template: str) -> Iterator[Tuple[str, str]]:
+    """("location:name", value) of everything a request sends"""
+    url = request.get("url") or ""
+    if isinstance(url, dict):
+        query = url.get("query")
+        if query is None:
+            raw = url.get("raw") or ""
+            query = [{"key": key, "value": value} for key, value in parse_qsl(raw.split("?", 1)[1], keep_blank_values=True)] if "?" in raw else []
+    else:
+        query = [{"key": key, "value": value} for key, value in parse_qsl(url.split("?", 1)[1], keep_blank_values=True)] if "?" in url else []
+    for parameter in query:
+        if isinstance(parameter, dict) and parameter.get("key") and not parameter.get("disabled"):
+            yield f"query:{parameter['key']}", str(parameter.get("value") if parameter.get("value") is not None else "")
+
+    # Path parameters are aligned with the tail of the request path, with Postman's :name
+    # segments resolved to the values actually sent
+    template_segments = template.strip("/").split("/")
+    path_segments = resolved_request_path(request).split("/")
+    for template_segment, segment in zip(reversed(template_segments), reversed(path_segments)):
+        if template_segment.startswith("{") and template_segment.endswith("}"):
+            yield f"path:{template_segment[1:-1]}", segment
+
+    for header in request.get("header") or []:
+        if isinstance(header, dict) and header.get("key") and not header.get("disabled"):
+            yield f"header:{header['key']}", str(header.get("value", ""))
+
+    body = request.get("body") or {}
+    if not isinstance(body, dict):
+        return
+    if body.get("mode") == "raw":
+        try:
+            document = json.loads(body.get("raw") or "")
+        except ValueError:
+            return
+        if isinstance(document, dict):
+            for name, value in document.items():
+                yield f"body:{name}", value if isinstance(value, str) else json.dumps(value)
+    elif body.get("mode") in ("urlencoded", "formdata"):
+        for field in body.get(body["mode"]) or []:
+            if isinstance(field, dict) and field.get("key") and not field.get("disabled"):
+                yield f"body:{field['key']}", str(field.get("value", ""))
+
+
+def build_coverage_index(spec: Dict[str, Any], collection: Dict[str, Any]) -> CoverageIndex:
+    """Match every request of collection to the spec and record what it covers, in one pass"""
+    index = CoverageIndex()
+    for template, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        for method in HTTP_METHODS:
+            operation = path_item.get(method)
+            if not isinstance(operation, dict):
+                continue
+            index.operations[f"{method.upper()} {template}"] = OperationCoverage(
+                method=method,
+                template=template,
+                documented_statuses=[str(status) for status in operation.get("responses") or {}],
+                documented_parameters=_documented_parameters(spec, path_item, operation),
+            )
+
+    for item, request in iter_request_items(collection):
+        index.total_requests += 1
+        method = (request.get("method") or "GET").upper()
+        name = str(item.get("name") or "unnamed")
+        matched: Optional[Operation] = match_operation(spec, method, request_path(request))
+        if matched is None:
+            index.unmatched.append(f"{method} /{request_path(request).strip('/')}: {name}")
+            continue
+
+        coverage = index.operations[f"{method} {matched[1]}"]
+        coverage.requests += 1
+        coverage.test_names.append(name)
+        coverage.asserted_statuses.update(_asserted_statuses(item))
+        for parameter, value in _sent_parameters(request, matched[1]):
+            # Undocumented headers are transport details such as Content-Type
+            if parameter.startswith("header:") and parameter not in coverage.documented_parameters:
+                continue
+            values = coverage.parameter_values.setdefault(parameter, [])
+            if value not in values:
+                values.append(value)
+    return index
+
+
+def coverage_report(spec: Any, collection: Any) -> Optional[str]:
+    """The coverage gap report of a collection, None when either document is not a JSON object"""
+    if not isinstance(spec, dict) or not isinstance(collection, dict):
+        return None
+    return build_coverage_index(spec, collection).report()
@@ -1,28 +1,189 @@
 import json
+import os
+import uuid
+import asyncio
+import aiofiles
+from contextlib import aclosing
+from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import SystemMessage, HumanMessage
+from llm_cache import astream_cached
+from model_registry import get_model
+from langchain_core.messages.ai import add_usage
 from states import AgentState
-from utils import save_postman_collection_to_file, validate_and_clean_json
+from utils import merge_shard_collections, save_postman_collection_to_file, validate_and_clean_json
+from spec_store import load_spec, spec_prompt_text
+from spec_slicing import shard_operations
 from typing_extensions import Literal
 from langgraph.types import Command
 from langgraph.graph import END
-from prompts import generate_postman_collection_sys_prompt
+from langgraph.config import get_stream_writer
+from incremental_json import IncrementalJSONParser, JSONStreamError
+from prompts import generate_postman_collection_sys_prompt, generate_postman_collection_request_prompt, openapi_spec_prompt
+from prompt_caching import layered_messages, record_cache_usage
 from datetime import datetime
 from logging_utils import setup_logging
 
 # Get a logger for this tools module using our improved setup
 tools_logger = setup_logging(__name__)
 
-def generate_new_postman_collection(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
+# ===== CONFIGURATION =====
+# "auto" shards specs with more than COLLECTION_SHARD_MAX_OPERATIONS operations, "on" always shards, "off" never does
+COLLECTION_SHARDING = os.getenv("COLLECTION_SHARDING", "auto").lower()
+# Most operations generated in one LLM call, larger tag/path groups are split
+COLLECTION_SHARD_MAX_OPERATIONS = int(os.getenv("COLLECTION_SHARD_MAX_OPERATIONS", "8"))
+# Shards generated at the same time
+COLLECTION_SHARD_CONCURRENCY = int(os.getenv("COLLECTION_SHARD_CONCURRENCY", "4"))
+# Stream the response and parse it incrementally instead of waiting for the whole of it
+COLLECTION_STREAMING = os.getenv("COLLECTION_STREAMING", "true").lower() == "true"
+# Further attempts after a streamed response turned out malformed or truncated
+COLLECTION_STREAM_RETRIES = int(os.getenv("COLLECTION_STREAM_RETRIES", "1"))
+# Completed collection items are appended here (one JSON object per line) while a response streams
+PARTIAL_COLLECTIONS_DIR = Path("artifacts") / "partial_collections"
+
+
+def _report_progress(progress: dict):
+    """Publish progress on the graph's custom stream, a no-op outside a graph run"""
+    try:
+        writer = get_stream_writer()
+    except Exception:
+        return
+    writer(progress)
+
+
+def _content_text(chunk) -> str:
+    # Anthropic messages and chunks carry a list of content blocks, OpenAI ones a string
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict) and block.get("type") == "text")
+
+
+async def stream_collection_json(model, messages, label: str = "collection"):
+    """
+    Stream a collection from the model, parsing it as it arrives.
+
+    Every completed top level item is appended to a partial file and reported as progress.
+    A response that does not start with JSON, breaks the JSON structure or is cut off is
+    abandoned as soon as that is detected and requested again, up to COLLECTION_STREAM_RETRIES
+    times. The partial file of the last failed attempt is kept for inspection.
+
+    Returns:
+        The parsed collection, None if every attempt failed
+    """
+    PARTIAL_COLLECTIONS_DIR.mkdir(parents=True, exist_ok=True)
+
+    for attempt in range(COLLECTION_STREAM_RETRIES + 1):
+        parser = IncrementalJSONParser(array_key="item")
+        items_path = PARTIAL_COLLECTIONS_DIR / f"{uuid.uuid4().hex}.items.ndjson"
+        stop_reason = None
+        usage = None
+        try:
+            async with aiofiles.open(items_path, "w", encoding="utf-8") as items_file:
+                # aclosing aborts the underlying request when the parser gives up early,
+                # retries bypass the response cache in case the cached response was the bad one
+                async with aclosing(astream_cached(model, messages, refresh=attempt > 0)) as stream:
+                    async for chunk in stream:
+                        stop_reason = chunk.response_metadata.get("stop_reason") or stop_reason
+                        if chunk.usage_metadata:
+                            usage = add_usage(usage, chunk.usage_metadata)
+                        for item in parser.feed(_content_text(chunk)):
+                            await items_file.write(json.dumps(item) + "\n")
+                            await items_file.flush()
+                            tools_logger.info(f"{label}: item {parser.items_completed} complete ({item.get('name', '') if isinstance(item, dict) else ''})")
+                            _report_progress({label: {"items": parser.items_completed, "characters": parser.chars}})
+
+            record_cache_usage("create_collection", usage)
+            if stop_reason == "max_tokens":
+                raise JSONStreamError("The response was cut off at max_tokens", truncated=True)
+            try:
+                collection = parser.close()
+            except JSONStreamError as e:
+                if e.truncated:
+                    raise
+                # Complete but not strictly valid, e.g. trailing commas, try the usual repairs
+                collection = validate_and_clean_json(parser.text())
+                if collection is None:
+                    raise
+
+            tools_logger.info(f"{label}: streamed {parser.chars} characters, {parser.items_completed} items")
+            items_path.unlink(missing_ok=True)
+            return collection
+
+        except JSONStreamError as e:
+            tools_logger.warning(f"{label}: attempt {attempt + 1} abandoned after {parser.chars} characters and {parser.items_completed} items: {e}")
+            if attempt < COLLECTION_STREAM_RETRIES:
+                items_path.unlink(missing_ok=True)
+            else:
+                tools_logger.error(f"{label}: giving up, items received so far are in {items_path}")
+
+    return None
+
+
+async def generate_collection_json(model, openapi_spec_doc: str, request_prompt: str, label: str = "collection"):
+    """One LLM call generating a Postman collection for a spec document, None if the response is not valid JSON"""
+    messages = layered_messages(
+        "create_collection",
+        generate_postman_collection_sys_prompt,
+        openapi_spec_prompt.format(openapi_spec_doc=openapi_spec_doc),
+        request_prompt
+    )
+
+    if COLLECTION_STREAMING:
+        return await stream_collection_json(model, messages, label)
+
+    # Invoke the model
+    response = await model.ainvoke(messages)
+    record_cache_usage("create_collection", response.usage_metadata)
+    response_text = _content_text(response)
+
+    tools_logger.info(f"Response received. Total characters: {len(response_text)}")
+    # Validate and clean the JSON response
+    return validate_and_clean_json(response_text)
+
+
+async def generate_sharded_collection(model, request_prompt: str, spec_artifact, shards):
+    """
+    Generate the collection of each shard concurrently and merge them into one collection
+    with a folder per shard. Wall-clock time follows the slowest shard rather than the
+    size of the whole spec.
+
+    Returns:
+        The merged collection, and the names of the shards that failed
+    """
+    semaphore = asyncio.Semaphore(max(1, COLLECTION_SHARD_CONCURRENCY))
+
+    async def generate_shard(name, operations):
+        async with semaphore:
+            tools_logger.info(f"Generating shard '{name}' ({len(operations)} operations)")
+            shard_spec_doc = await asyncio.to_thread(spec_prompt_text, spec_artifact, operations)
+            try:
+                return await generate_collection_json(model, shard_spec_doc, request_prompt, label=f"collection/{name}")
+            except Exception as e:
+                tools_logger.error(f"Shard '{name}' failed: {e}")
+                return None
+
+    # gather keeps the shards in spec order
+    results = await asyncio.gather(*[generate_shard(name, operations) for name, operations in shards])
+
+    # A shard that is not a collection or a list of items cannot be merged
+    failed = [name for (name, _), result in zip(shards, results) if not isinstance(result, (dict, list))]
+    info = spec_artifact.spec.get("info") or {}
+    collection = merge_shard_collections(
+        info.get("title", "API tests"),
+        [(name, result) for (name, _), result in zip(shards, results) if isinstance(result, (dict, list))]
+    )
+    return collection, failed
+
+
+async def generate_new_postman_collection(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
     """
     Creates a Postman collection from an OpenAPI specification using Anthropic's Claude model.
-    
+    Large specs are split by tag or path group and the shards are generated concurrently.
+
     Args:
         tool_context: ToolContext object containing the spec path in state
-        
+
     Returns:
         Dict containing the status of collection creation and relevant messages
     """
@@ -31,54 +192,51 @@ def generate_new_postman_collection(state: AgentState) -> Command[Literal["uploa
 
     spec_path = state["spec_fpath"]
 
-    # Read the actual content of the OpenAPI specification file
-    with open(spec_path, 'r') as spec_file:
-        spec_content = json.load(spec_file)
+    # Parsed once by validate_openapi_spec
+    spec_artifact = await load_spec(spec_path)
 
-    # Convert the content to a JSON string
-    openapi_spec_doc = json.dumps(spec_content, indent=2)
-
-    system_prompt = generate_postman_collection_sys_prompt.format(
+    # The date is per request, it goes after the spec so the instructions stay a stable prefix
+    request_prompt = generate_postman_collection_request_prompt.format(
         date=date
     )
 
-    user_prompt = f"""
-    OpenAPI specification :
-    {openapi_spec_doc}
-    """
-    
-    model = init_chat_model(
-        model="claude-sonnet-4-20250514",
-        model_provider="anthropic",
-        max_tokens=20000,
-        temperature=0,  # optional, adjust as needed
-    )
-    
-    # Invoke the model
-    response = model.invoke([SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)])
-    response_text = response.content
-    
-    tools_logger.info(f"Response received. Total characters: {len(response_text)}")
-    # Validate and clean the JSON response
-    spec = validate_and_clean_json(response_text)
-    
+    model = get_model("create_collection")
+
+    shards = shard_operations(spec_artifact.spec, COLLECTION_SHARD_MAX_OPERATIONS) if COLLECTION_SHARDING != "off" else []
+    operation_count = sum(len(operations) for _, operations in shards)
+    sharded = COLLECTION_SHARDING == "on" or (COLLECTION_SHARDING == "auto" and operation_count > COLLECTION_SHARD_MAX_OPERATIONS)
+
+    if sharded and shards:
+        tools_logger.info(f"Generating the collection in {len(shards)} shards for {operation_count} operations")
+        spec, failed = await generate_sharded_collection(model, request_prompt, spec_artifact, shards)
+        if failed:
+            return Command(
+                goto=END,
+                update={
+                    "status": "error",
+                    "reasoning": f"Failed to generate the Postman collection for {len(failed)} of {len(shards)} shards: {', '.join(failed)}"
+                }
+            )
+    else:
+        spec = await generate_collection_json(model, spec_artifact.prompt_text, request_prompt)
+
     if spec is None:
         return Command(
             goto=END,
             update={
-                "status": "error", 
+                "status": "error",
                 "reasoning": "Failed to parse JSON response from Claude"
             }
         )
-    
+
     tools_logger.info("Successfully converted spec to Postman collection with LLM.")
-    
-    # Save the result to the directory 
-    output_filename = save_postman_collection_to_file(spec, "created")
-    
+
+    # Save the result to the directory
+    output_filename = await asyncio.to_thread(save_postman_collection_to_file, spec, "created")
+
     return Command(
         goto="upload_to_gcp_bucket",
         update={
             "generated_collection_fpath": output_filename
         }
-    )
\ No newline at end of file
+    )
@@ -3,45 +3,116 @@ load_dotenv()
 
 from states import DataSearchState
 from prompts import data_search_agent_prompt
-from database_tools import describe_table_tool, execute_sql_tool, mark_complete_tool
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import SystemMessage, ToolMessage
+from observation_encoding import encode_observation
+from database_tools import describe_table_tool, describe_tables_tool, execute_sql_tool, mark_complete_tool
+from model_registry import get_model
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage, ToolMessage
 from langgraph.types import Command
 from langgraph.graph import StateGraph, START, END
+from token_utils import count_message_tokens
 from typing import List, Tuple
 from typing_extensions import Literal
 from logging_utils import setup_logging
+import os
 
 logger = setup_logging(__name__)
 
 # ===== CONFIGURATION =====
-tools = [describe_table_tool, execute_sql_tool, mark_complete_tool]
+tools = [describe_table_tool, describe_tables_tool, execute_sql_tool, mark_complete_tool]
 tools_by_name = {tool.name: tool for tool in tools}
 # Initialize model
-model = init_chat_model(
-    model="gpt-4o",
-    model_provider="openai", 
-    temperature=0.0
-)
+model = get_model("data_agent")
 model_with_tools = model.bind_tools(tools, tool_choice="auto", parallel_tool_calls=False)
 
+# Token budget for the conversation history sent on each turn (excluding the system prompt)
+DATA_AGENT_TOKEN_BUDGET = int(os.getenv("DATA_AGENT_TOKEN_BUDGET", "6000"))
+# Most recent tool outputs that are always sent in full
+DATA_AGENT_KEEP_TOOL_OUTPUTS = int(os.getenv("DATA_AGENT_KEEP_TOOL_OUTPUTS", "2"))
+# Hard cap on LLM turns before the search is marked as failed
+DATA_AGENT_MAX_TURNS = int(os.getenv("DATA_AGENT_MAX_TURNS", "12"))
+# Graph recursion limit for callers, every turn is an llm_call and a tool_node step
+DATA_AGENT_RECURSION_LIMIT = 2 * DATA_AGENT_MAX_TURNS + 5
+
 # ===== UTILS =====
 
 def format_tables(tables: List[Tuple[str, str]]) -> str:
     return "\n".join([f"- {name}: {desc}" for name, desc in tables])
 
+def fit_messages_to_budget(messages: List[AnyMessage], token_budget: int, keep_tool_outputs: int) -> List[AnyMessage]:
+    """
+    Elide the content of the oldest tool outputs until the conversation fits the token budget.
+    The messages themselves are kept so every tool call still has its ToolMessage, and the
+    newest keep_tool_outputs outputs are never elided. State is not modified.
+    """
+    if count_message_tokens(messages) <= token_budget:
+        return messages
+
+    # Describe each tool call by name and arguments so the elided output stays meaningful
+    calls_by_id = {
+        tool_call["id"]: tool_call
+        for message in messages if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    }
+    tool_indexes = [i for i, message in enumerate(messages) if isinstance(message, ToolMessage)]
+    elidable = tool_indexes[:max(0, len(tool_indexes) - keep_tool_outputs)]
+
+    fitted = list(messages)
+    for i in elidable:
+        message = fitted[i]
+        tool_call = calls_by_id.get(message.tool_call_id, {})
+        args = ", ".join(f"{key}={value}" for key, value in tool_call.get("args", {}).items())
+        fitted[i] = message.model_copy(update={
+            "content": f"[output of {tool_call.get('name', message.name)}({args}) elided to stay within the token budget, call the tool again if you need it]"
+        })
+        if count_message_tokens(fitted) <= token_budget:
+            break
+
+    logger.info(f"Conversation trimmed to {count_message_tokens(fitted)} tokens (budget {token_budget})")
+    return fitted
+
 # ===== WORKFLOW NODES =====
 
-def llm_call(state: DataSearchState):
+async def llm_call(state: DataSearchState) -> Command[Literal["tool_node", "__end__"]]:
+    turns = state.get("turns", 0)
+    if turns >= DATA_AGENT_MAX_TURNS:
+        reasoning = f"Stopped after {turns} turns without calling mark_complete (limit DATA_AGENT_MAX_TURNS={DATA_AGENT_MAX_TURNS})"
+        logger.warning(f"Lookup '{state['lookup_query']}': {reasoning}")
+        return Command(
+            goto=END,
+            update={
+                "status": "failed",
+                "reasoning": reasoning
+            }
+        )
+
     tables = format_tables(state["all_tables"])
     final_prompt = data_search_agent_prompt.format(lookup_query=state["lookup_query"], all_tables_formatted=tables)
-    response = model_with_tools.invoke(
-        [SystemMessage(content=final_prompt), *state["messages"]]
+    messages = fit_messages_to_budget(state["messages"], DATA_AGENT_TOKEN_BUDGET, DATA_AGENT_KEEP_TOOL_OUTPUTS)
+    response = await model_with_tools.ainvoke(
+        [SystemMessage(content=final_prompt), *messages]
     )
 
-    return {"messages": response}
+    if not response.tool_calls:
+        # Without a tool call there is nothing left to execute, end instead of looping
+        return Command(
+            goto=END,
+            update={
+                "messages": response,
+                "turns": turns + 1,
+                "status": "failed",
+                "reasoning": f"Model answered without calling a tool: {response.content}"
+            }
+        )
 
-def tool_node(state: DataSearchState) -> Command[Literal["llm_call", "__end__"]]:
+    return Command(
+        goto="tool_node",
+        update={
+            "messages": response,
+            "turns": turns + 1
+        }
+    )
+
+async def tool_node(state: DataSearchState) -> Command[Literal["llm_call", "__end__"]]:
     last_message = state["messages"][-1]
     
     tool_call = last_message.tool_calls[0]  # Assume single tool call for simplicity
@@ -65,9 +136,12 @@ def tool_node(state: DataSearchState) -> Command[Literal["llm_call", "__end__"]]
         )
 
     tool = tools_by_name[tool_name]
-    observation= tool.invoke(tool_call["args"])
+    tool_args = dict(args)
+    if tool_name == "execute_sql":
+        tool_args["use_cache"] = state.get("use_query_cache", True)
+    observation = await tool.ainvoke(tool_args)
     tool_output = ToolMessage(
-        content=str(observation),
+        content=encode_observation(tool_name, observation),
         name= tool_name,
         tool_call_id = tool_call["id"]
     )
@@ -81,10 +155,23 @@ def tool_node(state: DataSearchState) -> Command[Literal["llm_call", "__end__"]]
                     "tool_name": tool_name,
                     "status": observation["status"],
                     "table": args["table_name"],
-                    "data": observation["data"]
+                    "data": observation.get("data")
                 }
             }
         ) 
+    elif tool_name == "describe_tables":
+        return Command(
+            goto="llm_call",
+            update={
+                "messages": [tool_output],
+                "last_query_result" : {
+                    "tool_name": tool_name,
+                    "status": observation["status"],
+                    "tables": args["table_names"],
+                    "data": observation.get("data")
+                }
+            }
+        )
     elif tool_name == "execute_sql":
         return Command(
             goto="llm_call",
@@ -94,7 +181,8 @@ def tool_node(state: DataSearchState) -> Command[Literal["llm_call", "__end__"]]
                     "tool_name": tool_name,
                     "status": observation["status"],
                     "query": args["query"],
-                    "data": observation["data"]
+                    "data": observation.get("data"),
+                    "truncated": observation.get("truncated", False)
                 }
             }
         )
@@ -108,7 +196,6 @@ data_agent_builder.add_node("tool_node", tool_node)
 
 # Add edges to connect nodes
 data_agent_builder.add_edge(START, "llm_call")
-data_agent_builder.add_edge("llm_call", "tool_node")
 data_search_agent = data_agent_builder.compile()
 
 
@@ -1,12 +1,17 @@
 # simple_mcp_tool.py
 import asyncio
+import itertools
 import time
 import aiohttp
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Union
 from typing_extensions import Annotated
-from utils import _extract_rows
+from utils import _extract_rows, cap_rows
+from http_sessions import SessionPool
+from loop_runner import LoopRunner
+from caching import TTLCache
+from sql_utils import normalize_sql, is_cacheable_query, ensure_row_limit
 from logging_utils import setup_logging
 from dotenv import load_dotenv
 
@@ -15,75 +20,179 @@ load_dotenv()
 
 # LangChain imports
 from langchain.tools import BaseTool
+from langchain_core.tools import InjectedToolArg
 from langgraph.prebuilt import InjectedState
 from pydantic import BaseModel, Field
 
-# Try to import nest_asyncio to handle nested event loops
-try:
-    import nest_asyncio
-    nest_asyncio.apply()
-    NEST_ASYNCIO_AVAILABLE = True
-except ImportError:
-    NEST_ASYNCIO_AVAILABLE = False
-
 tools_logger = setup_logging(__name__)
 
+# ===== CONNECTION POOL CONFIGURATION =====
+MCP_TOOLBOX_URL = os.getenv('MCP_TOOLBOX_URL')
+MCP_POOL_LIMIT = int(os.getenv('MCP_POOL_LIMIT', '20'))
+MCP_POOL_LIMIT_PER_HOST = int(os.getenv('MCP_POOL_LIMIT_PER_HOST', '0'))
+MCP_KEEPALIVE_TIMEOUT = float(os.getenv('MCP_KEEPALIVE_TIMEOUT', '60'))
+MCP_CALL_TIMEOUT = float(os.getenv('MCP_CALL_TIMEOUT', '60'))
+
+# All MCP I/O runs on one background event loop, so sync and async callers share the
+# same keep-alive sessions
+mcp_loop = LoopRunner("mcp")
+
+# Shared keep-alive sessions, opened on FastAPI startup and closed on shutdown
+mcp_sessions = SessionPool(
+    "MCP",
+    limit=MCP_POOL_LIMIT,
+    limit_per_host=MCP_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=MCP_KEEPALIVE_TIMEOUT,
+)
+
+# ===== SCHEMA METADATA CACHE =====
+# Table lists and column descriptions hardly ever change between requests
+SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', '600'))
+SCHEMA_CACHE_SIZE = int(os.getenv('SCHEMA_CACHE_SIZE', '256'))
+
+schema_cache = TTLCache("schema", maxsize=SCHEMA_CACHE_SIZE, ttl=SCHEMA_CACHE_TTL)
+LIST_TABLES_CACHE_KEY = ("list_tables",)
+
+def describe_table_cache_key(table_name: str) -> tuple:
+    return ("describe_table", table_name)
+
+def invalidate_schema_cache(table_name: str = None) -> int:
+    """Drop cached schema metadata for one table, or everything when no table is given"""
+    if table_name is None:
+        return schema_cache.invalidate()
+    return schema_cache.invalidate(lambda key: key == describe_table_cache_key(table_name))
+
+# ===== QUERY RESULT CACHE =====
+# Read-only query results keyed by normalized SQL, bounded by entry count and total bytes
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '300'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '512'))
+QUERY_CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+def _result_size(result: Dict[str, Any]) -> int:
+    return len(json.dumps(result, default=str))
+
+query_cache = TTLCache(
+    "query",
+    maxsize=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL,
+    max_bytes=QUERY_CACHE_MAX_BYTES,
+    sizeof=_result_size,
+)
+
+# ===== RESULT SIZE LIMITS =====
+# Upper bounds on what one execute_sql call can return into the agent's context
+MAX_RESULT_ROWS = int(os.getenv('MAX_RESULT_ROWS', '50'))
+MAX_RESULT_BYTES = int(os.getenv('MAX_RESULT_BYTES', str(16 * 1024)))
+
+# JSON-RPC request ids, unique for the lifetime of the process
+_request_ids = itertools.count(1)
+
 class BaseMCPTool(BaseTool):
     """Base class for all MCP tools with common functionality"""
     
     # Define the URL as a class variable that can be overridden
-    mcp_url: str = os.getenv('MCP_TOOLBOX_URL')
+    mcp_url: str = MCP_TOOLBOX_URL
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
     
-    async def _call_mcp_tool(self, tool_name: str, arguments: dict = None) -> Dict[str, Any]:
-        """Call MCP tool using proper MCP protocol"""
-        payload = {
+    @staticmethod
+    def _build_request(tool_name: str, arguments: dict = None) -> Dict[str, Any]:
+        """Build a tools/call JSON-RPC request with a unique id"""
+        return {
             "jsonrpc": "2.0",
-            "id": 1,
+            "id": next(_request_ids),
             "method": "tools/call",
             "params": {
                 "name": tool_name,
                 "arguments": arguments or {}
             }
         }
+
+    @staticmethod
+    def _parse_rpc_response(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert one JSON-RPC response object into the tool call result format"""
+        if "error" in result:
+            return {"error": result["error"]["message"]}
+        
+        if "result" in result:
+            return {"success": True, "data": result["result"]}
+        
+        return {"success": True, "data": result}
+
+    async def _call_mcp_tool(self, tool_name: str, arguments: dict = None) -> Dict[str, Any]:
+        """Call MCP tool using proper MCP protocol"""
+        payload = self._build_request(tool_name, arguments)
         
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    self.mcp_url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    
-                    if response.status != 200:
-                        error_text = await response.text()
-                        return {"error": f"HTTP {response.status}: {error_text}"}
-                    
-                    result = await response.json()
-                    
-                    if "error" in result:
-                        return {"error": result["error"]["message"]}
-                    
-                    if "result" in result:
-                        return {"success": True, "data": result["result"]}
-                    
-                    return {"success": True, "data": result}
-                    
-            except Exception as e:
-                return {"error": f"Request failed: {str(e)}"}
+        # The pooled sessions belong to the MCP loop, hop onto it if called from another loop
+        posted = await mcp_loop.arun(self._post_mcp(payload))
+        if "error" in posted:
+            return posted
+        return self._parse_rpc_response(posted["response"])
+
+    async def _call_mcp_tools_batch(self, calls: List[Tuple[str, dict]]) -> List[Dict[str, Any]]:
+        """
+        Call several MCP tools with a single JSON-RPC batch request.
+
+        Args:
+            calls: (tool_name, arguments) pairs
+
+        Returns:
+            One result per call, in the order of calls, in the same format as _call_mcp_tool
+        """
+        if not calls:
+            return []
+
+        payloads = [self._build_request(tool_name, arguments) for tool_name, arguments in calls]
+        posted = await mcp_loop.arun(self._post_mcp(payloads))
+        responses = posted.get("response")
+
+        if not isinstance(responses, list):
+            # The server does not support batches, send the calls concurrently instead
+            tools_logger.warning(f"MCP batch request not supported ({posted.get('error', 'non-batch response')}), falling back to single calls")
+            return list(await asyncio.gather(*[
+                self._call_mcp_tool(tool_name, arguments) for tool_name, arguments in calls
+            ]))
+
+        # Batch responses may come back in any order, match them to the requests by id
+        responses_by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+        results = []
+        for payload in payloads:
+            response = responses_by_id.get(payload["id"])
+            if response is None:
+                results.append({"error": f"No response for request {payload['id']} in MCP batch"})
+            else:
+                results.append(self._parse_rpc_response(response))
+        return results
+
+    async def _post_mcp(self, payload: Union[dict, list]) -> Dict[str, Any]:
+        """
+        POST a JSON-RPC request or batch to the MCP server, must run on the MCP loop.
+        Returns {"response": decoded JSON body} or {"error": message}.
+        """
+        try:
+            session = mcp_sessions.session(self.mcp_url)
+            async with session.post(
+                self.mcp_url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=MCP_CALL_TIMEOUT)
+            ) as response:
+                
+                if response.status != 200:
+                    error_text = await response.text()
+                    return {"error": f"HTTP {response.status}: {error_text}"}
+                
+                return {"response": await response.json()}
+                
+        except asyncio.TimeoutError:
+            return {"error": f"Request timed out after {MCP_CALL_TIMEOUT}s"}
+        except Exception as e:
+            return {"error": f"Request failed: {str(e)}"}
     
     def _run(self, **kwargs) -> Dict[str, Any]:
-        """Sync wrapper for async method"""
-        if not NEST_ASYNCIO_AVAILABLE:
-            raise RuntimeError(
-                "nest_asyncio is required but not available. "
-                "Please install it with: pip install nest-asyncio"
-            )
-        
-        # nest_asyncio allows nested event loops
-        return asyncio.run(self._arun(**kwargs))
+        """Sync wrapper for async method, blocks until the MCP loop has run it"""
+        return mcp_loop.run(self._arun(**kwargs))
 
 # Input schema for the tool
 class ListTablesInput(BaseModel):
@@ -102,6 +211,11 @@ class ListTablesTool(BaseMCPTool):
     
     async def _arun(self, **kwargs) -> Dict[str, Any]:
         """Call the list-tables tool on MCP server"""
+        cached = schema_cache.get(LIST_TABLES_CACHE_KEY)
+        if cached is not None:
+            tools_logger.info("Serving list-tables from the schema cache")
+            return cached
+
         tools_logger.info("Calling list-tables via MCP protocol")
         
         result = await self._call_mcp_tool("list-tables", {})
@@ -131,12 +245,32 @@ class ListTablesTool(BaseMCPTool):
                         continue
             
             tools_logger.info(f"Found {len(tables)} tables")
-            return {"status": "success", "tables": tables}
+            output = {"status": "success", "tables": tables}
+            schema_cache.set(LIST_TABLES_CACHE_KEY, output)
+            return output
         
         else:
             return {"status": "success", "raw_data": data}
 
 
+def _describe_table_result(table_name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a describe-table MCP result into the tool output, caching successful schemas"""
+    if "error" in result:
+        tools_logger.error(f"MCP call failed: {result['error']}")
+        return {"status": "error", "message": result["error"]}
+    
+    # Extract table information from MCP response
+    data = result.get("data", {})
+    rows = _extract_rows(data)
+
+    tools_logger.info(f"Described table {table_name} with columns: {rows}")
+
+    output = {"status": "success", "data": rows}
+    # An unknown table comes back without columns, don't pin that in the cache
+    if rows:
+        schema_cache.set(describe_table_cache_key(table_name), output)
+    return output
+
 class DescribeTableInput(BaseModel):
     table_name: str = Field(description="Name of the table you want to get the schema for in a database.")
 
@@ -156,44 +290,107 @@ class DescribeTableTool(BaseMCPTool):
 
     async def _arun(self, table_name, **kwargs) -> Dict[str, Any]:
         """Call the describe-tables tool on MCP server"""
+        cached = schema_cache.get(describe_table_cache_key(table_name))
+        if cached is not None:
+            tools_logger.info(f"Serving describe table {table_name} from the schema cache")
+            return cached
+
         tools_logger.info("Calling describe table via MCP protocol")
         
         result = await self._call_mcp_tool("describe-table", {"table_name": table_name})
+        return _describe_table_result(table_name, result)
 
-        if "error" in result:
-            tools_logger.error(f"MCP call failed: {result['error']}")
-            return {"status": "error", "message": result["error"]}
-        
-        # Extract table information from MCP response
-        data = result.get("data", {})
-        rows = _extract_rows(data)
+class DescribeTablesInput(BaseModel):
+    table_names: List[str] = Field(description="Names of the tables you want to get the schemas for in a database.")
 
-        tools_logger.info(f"Described table {table_name} with columns: {rows}")
+class DescribeTablesTool(BaseMCPTool):
+    name: str = "describe_tables"
+    description: str = """
+    Get the schemas for several tables in the database in one call
 
-        return {"status": "success", "data": rows}
+    Returns:
+        A dict with:
+          - status: "success" | "error"
+          - data: dict mapping each described table name to a list[dict] of rows. 
+          Each row represents information about one column in that table. 
+          - errors: dict mapping table name to error details for tables that could not be described
+          - message: str error details (present when status == "error")
+    """
+    args_schema: type[BaseModel] = DescribeTablesInput
+
+    async def _arun(self, table_names, **kwargs) -> Dict[str, Any]:
+        """Describe several tables with one JSON-RPC batch, skipping tables already cached"""
+        table_names = list(dict.fromkeys(table_names))
+        described = {}
+        errors = {}
+
+        missing = []
+        for table_name in table_names:
+            cached = schema_cache.get(describe_table_cache_key(table_name))
+            if cached is not None:
+                described[table_name] = cached["data"]
+            else:
+                missing.append(table_name)
+
+        tools_logger.info(f"Describing tables {missing} via MCP batch ({len(described)} served from the schema cache)")
+        results = await self._call_mcp_tools_batch([
+            ("describe-table", {"table_name": table_name}) for table_name in missing
+        ])
+        for table_name, result in zip(missing, results):
+            output = _describe_table_result(table_name, result)
+            if output["status"] == "success":
+                described[table_name] = output["data"]
+            else:
+                errors[table_name] = output["message"]
+
+        if not described:
+            return {"status": "error", "message": f"Could not describe any of the tables: {errors}", "errors": errors}
+
+        output = {
+            "status": "success",
+            "data": {table_name: described[table_name] for table_name in table_names if table_name in described}
+        }
+        if errors:
+            output["errors"] = errors
+        return output
 
 class ExecuteSQLInput(BaseModel):
     query: str = Field(description="SQL query that you want to execute on the database")
+    # Injected by the caller, not part of the schema shown to the LLM
+    use_cache: Annotated[bool, InjectedToolArg] = Field(default=True, description="Whether the result may be served from the query cache")
 
 class ExecuteSQLTool(BaseMCPTool):
     name: str = "execute_sql"
     description: str = """
-    Execute an SQL query on the database
+    Execute an SQL query on the database. Results are capped to a fixed number of rows,
+    select only the columns you need and filter with WHERE.
 
     Returns:
         A dict with:
           - status: "success" | "error"
           - data: list[dict] of rows (present when status == "success"). 
           Each row represents one row in the SQL query result. 
+          - truncated: True when rows were left out because of the result limits
+          - note: str describing how many rows were left out (present when truncated)
           - message: str error details (present when status == "error")
     """
     args_schema: type[BaseModel] = ExecuteSQLInput
 
-    async def _arun(self, query, **kwargs) -> Dict[str, Any]:
-        """Call the list-tables tool on MCP server"""
-        tools_logger.info("Calling describe table via MCP protocol")
+    async def _arun(self, query, use_cache: bool = True, **kwargs) -> Dict[str, Any]:
+        """Call the execute-sql tool on MCP server"""
+        cache_key = (self.mcp_url, normalize_sql(query))
+        cacheable = use_cache and is_cacheable_query(query)
+        if cacheable:
+            cached = query_cache.get(cache_key)
+            if cached is not None:
+                tools_logger.info("Serving execute-sql from the query cache")
+                return cached
+
+        # Ask for one row more than the cap so truncation can be detected
+        bounded_query, limit_injected = ensure_row_limit(query, MAX_RESULT_ROWS + 1)
+        tools_logger.info("Calling execute sql via MCP protocol")
         
-        result = await self._call_mcp_tool("execute-sql", {"sql": query})
+        result = await self._call_mcp_tool("execute-sql", {"sql": bounded_query})
 
         if "error" in result:
             tools_logger.error(f"MCP call failed: {result['error']}")
@@ -202,8 +399,30 @@ class ExecuteSQLTool(BaseMCPTool):
         # Extract table information from MCP response
         data = result.get("data", {})
         rows = _extract_rows(data)
+        output = self._bounded_output(rows, limit_injected)
+        if cacheable:
+            query_cache.set(cache_key, output)
+        return output
 
-        return {"status": "success", "data": rows}
+    @staticmethod
+    def _bounded_output(rows: List[Dict[str, Any]], limit_injected: bool) -> Dict[str, Any]:
+        """Cap rows to MAX_RESULT_ROWS / MAX_RESULT_BYTES and describe what was left out"""
+        kept, omitted, cells_cut = cap_rows(rows, MAX_RESULT_ROWS, MAX_RESULT_BYTES)
+        output = {"status": "success", "data": kept, "truncated": omitted > 0 or cells_cut > 0}
+        if output["truncated"]:
+            if not kept:
+                output["note"] = f"No rows shown, a single row is over {MAX_RESULT_BYTES} bytes. Select fewer or smaller columns."
+            elif limit_injected and len(rows) > MAX_RESULT_ROWS:
+                # The injected LIMIT hides how many rows the full query would return
+                output["note"] = f"Showing {len(kept)} rows, more rows not shown. Add filters to narrow the query."
+            elif omitted:
+                output["note"] = f"Showing {len(kept)} rows, {omitted} more rows not shown. Add filters to narrow the query."
+            else:
+                output["note"] = "Showing 1 row."
+            if cells_cut:
+                output["note"] += f" {cells_cut} oversized values were cut, select fewer or smaller columns to see them whole."
+            tools_logger.info(f"Truncated execute-sql result: {output['note']}")
+        return output
 
 class MarkCompleteInput(BaseModel):
     status: str = Field(
@@ -257,4 +476,5 @@ class MarkCompleteTool(BaseTool):
 mark_complete_tool = MarkCompleteTool()
 list_tables_tool = ListTablesTool()
 describe_table_tool = DescribeTableTool()
+describe_tables_tool = DescribeTablesTool()
 execute_sql_tool = ExecuteSQLTool()
@@ -1,11 +1,14 @@
-from utils import merge_and_save_postman_collection, get_last_test_case_from_collection
+from utils import merge_and_save_postman_collection, get_last_test_case_from_collection, read_json_file
+from spec_store import load_spec
+from spec_slicing import dump_compact
+from coverage_index import coverage_report
 from logging_utils import setup_logging
+import asyncio
 import json
-import os
 from states import AgentState, PlannedTestCases
-from langchain.chat_models import init_chat_model
-from prompts import plan_functional_test_cases_sys_prompt, functional_test_case_generation_sys_prompt
-from langchain_core.messages import SystemMessage 
+from model_registry import get_structured_model
+from prompts import plan_functional_test_cases_sys_prompt, plan_functional_test_cases_request_prompt, functional_test_case_generation_sys_prompt, functional_test_case_generation_request_prompt, openapi_spec_prompt
+from prompt_caching import layered_messages, unwrap_structured
 from typing_extensions import Literal
 from langgraph.types import Command
 from langgraph.graph import END
@@ -14,44 +17,39 @@ from langgraph.graph import END
 # Get a logger for this tools module using our improved setup
 tools_logger = setup_logging(__name__)
 
-model = init_chat_model(
-    model="gpt-4o",
-    model_provider="openai", 
-    temperature=0.0
-)
 
-
-def define_new_tests(openapi_spec_doc, postman_collection, user_requirement):
+async def define_new_tests(openapi_spec_doc, collection_coverage, user_requirement):
     """
     Identify new test cases to add to an existing Postman collection based on user requirements.
 
     Args:
-        client: OpenAI client instance for making API calls.
         openapi_spec_doc (str): JSON string of the OpenAPI specification.
-        postman_collection (str): JSON string of the existing Postman collection.
+        collection_coverage (str): Coverage gap report of the existing Postman collection.
         user_requirement (str): User requirements as a string.
 
     Returns:
         str: Bullet point list of new test case descriptions, or an empty string if no new tests are needed.
     """
 
-    structured_output_model = model.with_structured_output(PlannedTestCases)
+    structured_output_model = get_structured_model("enhance_collection", PlannedTestCases, include_raw=True)
 
-    system_prompt = plan_functional_test_cases_sys_prompt.format(
-        openapi_spec_doc=openapi_spec_doc,
-        postman_collection=postman_collection,
-        user_requirement=user_requirement
+    messages = layered_messages(
+        "enhance_collection",
+        plan_functional_test_cases_sys_prompt,
+        openapi_spec_prompt.format(openapi_spec_doc=openapi_spec_doc),
+        plan_functional_test_cases_request_prompt.format(
+            collection_coverage=collection_coverage,
+            user_requirement=user_requirement
+        )
     )
 
-    response = structured_output_model.invoke([
-        SystemMessage(content=system_prompt)
-    ])
+    response = unwrap_structured("enhance_collection", await structured_output_model.ainvoke(messages))
 
     return response.test_cases
 
 
 
-def generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests):
+async def generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests):
     """
     Generate new Postman test cases based on test case descriptions and OpenAPI spec.
 
@@ -63,31 +61,29 @@ def generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests):
     Returns:
         list: List of new Postman test case objects.
     """
-    # Load output schema     
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    schema_path = os.path.join(base_dir, 'response_schemas', 'response_schema_enhance.json')
-    tools_logger.info(f"Loading Postman test case schema from: {schema_path}")
-    with open(schema_path, 'r') as f:
-        POSTMAN_TEST_CASE_SCHEMA = json.load(f)
-
-    test_case = get_last_test_case_from_collection(collection_path)
+    test_case = await asyncio.to_thread(get_last_test_case_from_collection, collection_path)
     test_case_str = json.dumps(test_case, indent=2)
 
-    structured_model = model.with_structured_output(
-        schema=POSTMAN_TEST_CASE_SCHEMA,
+    # Bound to the response_schemas/response_schema_enhance.json output schema once per process
+    structured_model = get_structured_model(
+        "enhance_collection",
+        "response_schema_enhance",
         method="json_schema",
-        strict=True
+        strict=True,
+        include_raw=True
     )
 
-    system_prompt = functional_test_case_generation_sys_prompt.format(
-        test_case_str=test_case_str,
-        openapi_spec_doc=openapi_spec_doc,
-        new_tests="\n".join(new_tests)
+    messages = layered_messages(
+        "enhance_collection",
+        functional_test_case_generation_sys_prompt,
+        openapi_spec_prompt.format(openapi_spec_doc=openapi_spec_doc),
+        functional_test_case_generation_request_prompt.format(
+            test_case_str=test_case_str,
+            new_tests="\n".join(new_tests)
+        )
     )
 
-    postman_collection_object = structured_model.invoke([
-        SystemMessage(content=system_prompt),
-    ])
+    postman_collection_object = unwrap_structured("enhance_collection", await structured_model.ainvoke(messages))
 
     new_collection_list = postman_collection_object["test_cases"]
     
@@ -95,7 +91,7 @@ def generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests):
 
 
 
-def enhance_postman_collection(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
+async def enhance_postman_collection(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
     """
     Enhance an existing Postman collection by adding new test cases based on user requirements.
 
@@ -108,23 +104,24 @@ def enhance_postman_collection(state: AgentState) -> Command[Literal["upload_to_
 
     tools_logger.info("Enhancing existing Postman collection with new test(s)")
 
-    # Convert OpenAPI spec to JSON string
+    # Serialised OpenAPI spec, parsed once by validate_openapi_spec
     spec_path = state["spec_fpath"]
-    with open(spec_path, 'r') as f:
-        openapi_spec = json.load(f)
-    openapi_spec_doc = json.dumps(openapi_spec, indent=2)
+    spec_artifact = await load_spec(spec_path)
+    openapi_spec_doc = spec_artifact.prompt_text
 
-    # Get existing postman collection
+    # Get existing postman collection, the planner gets its coverage gap report rather than the collection itself
     collection_path = state["existing_collection_fpath"]
-    with open(collection_path, 'r') as f:
-        current_tests = json.load(f)
-    postman_collection = json.dumps(current_tests, indent=2)
+    current_tests = await read_json_file(collection_path)
+    collection_coverage = await asyncio.to_thread(coverage_report, spec_artifact.spec, current_tests)
+    if collection_coverage is None:
+        collection_coverage = dump_compact(current_tests)
+    tools_logger.info(f"Collection coverage report: {len(collection_coverage)} characters")
 
     # Get user requirements 
     user_req = state["test_data_scenario"]
 
     try:
-        new_tests = define_new_tests(openapi_spec_doc, postman_collection, user_req)
+        new_tests = await define_new_tests(openapi_spec_doc, collection_coverage, user_req)
         tools_logger.info(f"Planned new test cases: {new_tests}")
 
     except Exception as e:
@@ -138,7 +135,7 @@ def enhance_postman_collection(state: AgentState) -> Command[Literal["upload_to_
 
     if new_tests:
         try: 
-            new_collection_list = generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests)
+            new_collection_list = await generate_new_postman_tests(collection_path, openapi_spec_doc, new_tests)
 
         except Exception as e:
             return Command(
@@ -149,7 +146,7 @@ def enhance_postman_collection(state: AgentState) -> Command[Literal["upload_to_
                 }
             )     
         
-        output = merge_and_save_postman_collection(current_tests, new_collection_list)
+        output = await asyncio.to_thread(merge_and_save_postman_collection, current_tests, new_collection_list)
 
         return Command(
             goto="upload_to_gcp_bucket",
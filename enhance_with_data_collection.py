@@ -1,81 +1,84 @@
 import json
-import os
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import SystemMessage, HumanMessage
+from model_registry import get_structured_model
 from states import AgentState
-from utils import get_last_test_case_from_collection, merge_and_save_postman_collection
+from utils import get_last_test_case_from_collection, merge_and_save_postman_collection, read_json_file, read_text_file
+from spec_store import load_spec, spec_prompt_text
+from spec_slicing import collection_operations
 from typing_extensions import Literal
 from langgraph.types import Command
 from langgraph.graph import END
-from prompts import generate_data_test_cases_sys_prompt
+from prompts import generate_data_test_cases_sys_prompt, generate_data_test_cases_request_prompt, openapi_spec_prompt
+from prompt_caching import layered_messages, unwrap_structured
+from lookup_artifacts import read_lookup_records, render_lookup_records
+from token_utils import count_tokens
 from datetime import datetime
 from logging_utils import setup_logging
 
 tools_logger = setup_logging(__name__)
 
-def generate_new_postman_tests_with_data(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
-    # Load output schema from file
+async def generate_new_postman_tests_with_data(state: AgentState) -> Command[Literal["upload_to_gcp_bucket", "__end__"]]:
     tools_logger.info("generating new postman tests based on data")
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    schema_path = os.path.join(base_dir, 'response_schemas', 'response_schema_enhance.json')
-    tools_logger.info(f"Loading Postman test case schema from: {schema_path}")
-    with open(schema_path, 'r') as f:
-        POSTMAN_TEST_CASE_SCHEMA = json.load(f)
-
-    # Get openapi spec
-    spec_path = state["spec_fpath"]
-    with open(spec_path, 'r') as f:
-        openapi_spec = json.load(f)
-    openapi_spec_doc = json.dumps(openapi_spec, indent=2)
 
     # Get existing collection and one example of postman test
     collection_path = state["existing_collection_fpath"]
-    with open(collection_path, 'r') as f:
-        current_tests = json.load(f)
-    test_case = get_last_test_case_from_collection(collection_path)
+    current_tests = await read_json_file(collection_path)
+
+    # Get openapi spec, parsed once by validate_openapi_spec and sliced to the operations
+    # the collection exercises, the data tests are variations of those requests
+    spec_path = state["spec_fpath"]
+    spec_artifact = await load_spec(spec_path)
+    operations = collection_operations(spec_artifact.spec, current_tests) if isinstance(spec_artifact.spec, dict) else []
+    openapi_spec_doc = await asyncio.to_thread(spec_prompt_text, spec_artifact, operations)
+    test_case = await asyncio.to_thread(get_last_test_case_from_collection, collection_path)
     test_case_str = json.dumps(test_case, indent=2)
 
     # Get the test data 
     user_requirement = state["test_data_scenario"]
 
+    # Lookup results are NDJSON records, rendered as compact deduplicated tables for the prompt
     test_data_path = state["data_fpath"]
-    with open(test_data_path, 'r') as f:
-        data_content = f.read()
+    if test_data_path.endswith(".ndjson"):
+        records = await read_lookup_records(test_data_path)
+        data_content, render_stats = await asyncio.to_thread(render_lookup_records, records)
+        tools_logger.info(
+            f"Test data: {count_tokens(data_content)} tokens for {render_stats['lookups']} lookups and {render_stats['rows']} rows "
+            f"({render_stats['duplicate_rows']} duplicate rows and {render_stats['repeated_results']} repeated results left out)"
+        )
+    else:
+        data_content = await read_text_file(test_data_path)
 
-    # Create the prompt
-    prompt = generate_data_test_cases_sys_prompt.format(
-        test_case_str=test_case_str,
-        openapi_spec_doc=openapi_spec_doc,
-        user_requirement=user_requirement,
-        data_content=data_content
+    messages = layered_messages(
+        "enhance_collection_with_data",
+        generate_data_test_cases_sys_prompt,
+        openapi_spec_prompt.format(openapi_spec_doc=openapi_spec_doc),
+        generate_data_test_cases_request_prompt.format(
+            test_case_str=test_case_str,
+            user_requirement=user_requirement,
+            data_content=data_content
+        )
     )
     tools_logger.info("calling gpt to generate new test cases based on the data")
 
-    model = init_chat_model(
-        model="gpt-4o",
-        model_provider="openai", 
-        temperature=0.0
-    )
-    
-    # Create a model with JSON schema structured output
-    structured_model = model.with_structured_output(
-        schema=POSTMAN_TEST_CASE_SCHEMA,
+    # Model with the response_schemas/response_schema_enhance.json structured output, bound once per process
+    structured_model = get_structured_model(
+        "enhance_collection_with_data",
+        "response_schema_enhance",
         method="json_schema",
-        strict=True
+        strict=True,
+        include_raw=True
     )
     
     # Use LangChain to call the model
-    postman_collection_object = structured_model.invoke([
-        SystemMessage(content=prompt),
-    ])
+    postman_collection_object = unwrap_structured("enhance_collection_with_data", await structured_model.ainvoke(messages))
 
     # Extract test cases from the structured response
     new_collection_list = postman_collection_object["test_cases"]
     
-    output = merge_and_save_postman_collection(current_tests, new_collection_list, True)
+    output = await asyncio.to_thread(merge_and_save_postman_collection, current_tests, new_collection_list, True)
 
     if output["status"] != "success":
         return Command(
@@ -0,0 +1,71 @@
+"""
+Long-lived keep-alive aiohttp sessions, one per base URL, shared between calls.
+"""
+
+import asyncio
+from typing import Dict, Optional, Tuple
+import aiohttp
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class SessionPool:
+    """One keep-alive aiohttp session per URL, bound to the event loop that created it"""
+
+    def __init__(self, name: str, limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 60, timeout: Optional[float] = None):
+        """
+        Args:
+            name: Name used in log messages
+            limit: Maximum number of simultaneous connections per session (0 for no limit)
+            limit_per_host: Maximum number of simultaneous connections to one host (0 for no limit)
+            keepalive_timeout: Seconds an idle connection is kept open for reuse
+            timeout: Default total timeout in seconds for requests made with the sessions
+        """
+        self.name = name
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        # aiohttp sessions can only be used on the loop they were created on
+        self._sessions: Dict[Tuple[str, asyncio.AbstractEventLoop], aiohttp.ClientSession] = {}
+
+    def session(self, url: str) -> aiohttp.ClientSession:
+        """Return the pooled session for url on the running loop, creating it if needed"""
+        loop = asyncio.get_running_loop()
+        self._drop_stale_sessions()
+
+        session = self._sessions.get((url, loop))
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[(url, loop)] = session
+            logger.info(f"Opened {self.name} session pool for {url} (limit={self.limit}, keepalive={self.keepalive_timeout}s)")
+        return session
+
+    async def open(self, *urls: str):
+        """Eagerly create the sessions for the given URLs, skipping empty ones"""
+        for url in urls:
+            if url:
+                self.session(url)
+
+    async def close(self):
+        """Close every session owned by the running loop"""
+        loop = asyncio.get_running_loop()
+        for key, session in list(self._sessions.items()):
+            if key[1] is loop:
+                await session.close()
+                del self._sessions[key]
+        logger.info(f"Closed {self.name} session pool")
+
+    def _drop_stale_sessions(self):
+        # Sessions created on a loop that has since been closed can never be used again
+        for key in [key for key in self._sessions if key[1].is_closed()]:
+            del self._sessions[key]
@@ -0,0 +1,175 @@
+"""
+Incremental parser for JSON streamed from an LLM that rejects malformed output early and
+yields the elements of one root array as soon as each is complete.
+"""
+
+import json
+from typing import Any, List, Optional
+
+OPENING = {"{": "}", "[": "]"}
+CLOSING = {"}", "]"}
+
+
+class JSONStreamError(ValueError):
+    """Raised when a streamed document is malformed or truncated"""
+
+    def __init__(self, message: str, truncated: bool = False):
+        super().__init__(message)
+        self.truncated = truncated
+
+
+class IncrementalJSONParser:
+    """Validates the structure of a streamed JSON document and yields completed array elements"""
+
+    def __init__(self, array_key: Optional[str] = "item"):
+        """
+        Args:
+            array_key: Key of the root object whose array elements are returned by feed() as
+                soon as they are complete, None to only validate the structure
+        """
+        self.array_key = array_key
+        self.chars = 0
+        self.items_completed = 0
+        self._chunks: List[str] = []
+        self._started = False
+        self._finished = False
+        self._root_start = 0  # Offsets of the root value in the fed text
+        self._root_end = 0
+        self._prefix: List[str] = []  # Text before the root value, e.g. a ```json fence
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        # Root object key tracking
+        self._expect_key = False
+        self._key_parts: Optional[List[str]] = None
+        self._current_key: Optional[str] = None
+        self._in_array = False
+        # Text of the array element being captured
+        self._element_parts: Optional[List[str]] = None
+
+    @property
+    def complete(self) -> bool:
+        """True once the root value has been closed"""
+        return self._finished
+
+    @property
+    def depth(self) -> int:
+        return len(self._stack)
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Consume the next chunk of the response.
+
+        Returns:
+            The array elements completed by this chunk, parsed
+
+        Raises:
+            JSONStreamError: as soon as the text cannot be the start of a valid document
+        """
+        self._chunks.append(text)
+        self.chars += len(text)
+        completed = []
+        offset = self.chars - len(text)
+        capture_start = 0 if self._element_parts is not None else None
+        key_start = 0 if self._key_parts is not None else None
+
+        for i, char in enumerate(text):
+            if not self._started:
+                if char in OPENING:
+                    self._check_prefix()
+                    self._started = True
+                    self._root_start = offset + i
+                    self._stack.append(OPENING[char])
+                    self._expect_key = char == "{"
+                else:
+                    self._prefix.append(char)
+                    if len(self._prefix) > 64:
+                        self._check_prefix()
+                continue
+
+            if self._finished:
+                if not char.isspace() and char != "`":
+                    raise JSONStreamError(f"Unexpected content after the end of the document: {text[i:i + 40]!r}")
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if key_start is not None:
+                        self._key_parts.append(text[key_start:i])
+                        self._current_key = "".join(self._key_parts)
+                        self._key_parts = None
+                        key_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if len(self._stack) == 1 and self._expect_key:
+                    self._key_parts = []
+                    key_start = i + 1
+                    self._expect_key = False
+            elif char in OPENING:
+                if self._in_array and len(self._stack) == 2:
+                    self._element_parts = []
+                    capture_start = i
+                if len(self._stack) == 1 and char == "[" and self.array_key is not None and self._current_key == self.array_key:
+                    self._in_array = True
+                self._stack.append(OPENING[char])
+            elif char in CLOSING:
+                if not self._stack or self._stack[-1] != char:
+                    raise JSONStreamError(f"Unexpected {char!r} at character {offset + i}")
+                self._stack.pop()
+                if self._element_parts is not None and len(self._stack) == 2:
+                    self._element_parts.append(text[capture_start:i + 1])
+                    try:
+                        completed.append(json.loads("".join(self._element_parts)))
+                    except ValueError as e:
+                        raise JSONStreamError(f"Invalid element {self.items_completed + 1} of {self.array_key!r}: {e}")
+                    self.items_completed += 1
+                    self._element_parts = None
+                    capture_start = None
+                elif self._in_array and len(self._stack) == 1:
+                    self._in_array = False
+                if not self._stack:
+                    self._finished = True
+                    self._root_end = offset + i + 1
+            elif char == "," and len(self._stack) == 1 and self._stack[0] == "}":
+                self._expect_key = True
+
+        if self._element_parts is not None and capture_start is not None:
+            self._element_parts.append(text[capture_start:])
+        if self._key_parts is not None and key_start is not None:
+            self._key_parts.append(text[key_start:])
+        return completed
+
+    def text(self) -> str:
+        """Everything fed so far"""
+        return "".join(self._chunks)
+
+    def close(self) -> Any:
+        """
+        Finish the stream and return the parsed document.
+
+        Raises:
+            JSONStreamError: if the document never started, is unterminated (truncated=True)
+                or is not valid JSON
+        """
+        if not self._started:
+            raise JSONStreamError("The response does not contain a JSON document")
+        if not self._finished:
+            raise JSONStreamError(f"The response ended inside the document at depth {self.depth}", truncated=True)
+
+        try:
+            return json.loads(self.text()[self._root_start:self._root_end])
+        except ValueError as e:
+            raise JSONStreamError(f"Invalid JSON: {e}")
+
+    def _check_prefix(self):
+        prefix = "".join(self._prefix).strip()
+        # A markdown fence such as ```json is tolerated in front of the document
+        if prefix and not (prefix.startswith("```") and prefix[3:].strip().isalnum() or prefix == "```"):
+            raise JSONStreamError(f"The response does not start with JSON: {prefix[:40]!r}")
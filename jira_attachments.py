@@ -0,0 +1,204 @@
+"""
+Concurrent, retried Jira attachment downloads through the content-addressed attachment cache.
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import weakref
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+import aiofiles
+import aiohttp
+from attachment_cache import AttachmentCache, file_sha256
+from http_sessions import SessionPool
+from logging_utils import setup_logging
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = setup_logging(__name__)
+
+# Jira credentials from environment
+JIRA_TOKEN = os.getenv("JIRA_API_TOKEN")
+JIRA_EMAIL = os.getenv("JIRA_EMAIL")
+
+# ===== CONFIGURATION =====
+JIRA_DOWNLOAD_TIMEOUT = float(os.getenv("JIRA_DOWNLOAD_TIMEOUT", "60"))
+JIRA_MAX_ATTACHMENT_BYTES = int(os.getenv("JIRA_MAX_ATTACHMENT_BYTES", str(50 * 1024 * 1024)))
+JIRA_DOWNLOAD_RETRIES = int(os.getenv("JIRA_DOWNLOAD_RETRIES", "3"))
+JIRA_RETRY_BACKOFF = float(os.getenv("JIRA_RETRY_BACKOFF", "0.5"))
+JIRA_ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("JIRA_ATTACHMENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+JIRA_ATTACHMENT_REVALIDATE = os.getenv("JIRA_ATTACHMENT_REVALIDATE", "false").lower() == "true"
+JIRA_ATTACHMENT_INDEX_SAVE_DELAY = float(os.getenv("JIRA_ATTACHMENT_INDEX_SAVE_DELAY", "1.0"))
+CHUNK_SIZE = 8192
+
+# Create downloads directory
+DOWNLOAD_DIR = Path("downloads")
+DOWNLOAD_DIR.mkdir(exist_ok=True)
+
+jira_sessions = SessionPool("Jira", limit=10, keepalive_timeout=60)
+attachment_cache = AttachmentCache(DOWNLOAD_DIR, max_bytes=JIRA_ATTACHMENT_CACHE_MAX_BYTES, save_delay=JIRA_ATTACHMENT_INDEX_SAVE_DELAY)
+
+# One lock per attachment id so concurrent runs download a shared attachment only once
+_attachment_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class AttachmentDownloadError(Exception):
+    """Raised when an attachment cannot be downloaded"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _auth_headers() -> dict:
+    # Basic auth for Jira
+    auth = base64.b64encode(f"{JIRA_EMAIL}:{JIRA_TOKEN}".encode()).decode()
+    return {"Authorization": f"Basic {auth}"}
+
+
+async def _download_once(url: str, file_path: Path, etag: Optional[str] = None) -> Optional[Tuple[str, int, Optional[str]]]:
+    """
+    One download attempt, streams the body to file_path within the size limit.
+
+    Returns:
+        (sha256, size, etag) of the downloaded content, or None when the server confirmed
+        with a 304 that the content still matches etag
+    """
+    origin = "{0.scheme}://{0.netloc}".format(urlsplit(url))
+    session = jira_sessions.session(origin)
+    timeout = aiohttp.ClientTimeout(total=JIRA_DOWNLOAD_TIMEOUT)
+    headers = _auth_headers()
+    if etag:
+        headers["If-None-Match"] = etag
+
+    async with session.get(url, headers=headers, timeout=timeout) as response:
+        if etag and response.status == 304:
+            return None
+        if response.status != 200:
+            retryable = response.status == 429 or response.status >= 500
+            raise AttachmentDownloadError(f"Failed to download: {response.status}", retryable=retryable)
+
+        if response.content_length and response.content_length > JIRA_MAX_ATTACHMENT_BYTES:
+            raise AttachmentDownloadError(
+                f"Attachment is {response.content_length} bytes, limit is {JIRA_MAX_ATTACHMENT_BYTES}"
+            )
+
+        size = 0
+        digest = hashlib.sha256()
+        async with aiofiles.open(file_path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                size += len(chunk)
+                if size > JIRA_MAX_ATTACHMENT_BYTES:
+                    raise AttachmentDownloadError(f"Attachment exceeds the limit of {JIRA_MAX_ATTACHMENT_BYTES} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+
+        return digest.hexdigest(), size, response.headers.get("ETag")
+
+
+async def download_file(url: str, file_path: Path, etag: Optional[str] = None) -> Optional[Tuple[str, int, Optional[str]]]:
+    """Download url to file_path, retrying transient failures with backoff. See _download_once for the result"""
+    for attempt in range(JIRA_DOWNLOAD_RETRIES + 1):
+        try:
+            return await _download_once(url, file_path, etag)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = AttachmentDownloadError(f"Request failed: {e!r}", retryable=True)
+        except AttachmentDownloadError as e:
+            error = e
+
+        if not error.retryable or attempt == JIRA_DOWNLOAD_RETRIES:
+            logger.error(f"Failed to download {url}: {error}")
+            raise error
+
+        delay = JIRA_RETRY_BACKOFF * 2 ** attempt
+        logger.warning(f"Download of {url} failed ({error}), retrying in {delay}s")
+        await asyncio.sleep(delay)
+
+
+async def _cached_file(attachment) -> Optional[dict]:
+    """The cache entry of an attachment if its file is intact, pinned, dropping corrupted entries"""
+    entry = attachment_cache.lookup(attachment.id)
+    if entry is None:
+        return None
+    try:
+        intact = await asyncio.to_thread(file_sha256, entry["path"]) == entry["sha256"]
+    except OSError:
+        intact = False
+    if not intact:
+        logger.warning(f"Cached file for attachment {attachment.id} does not match its digest, downloading again")
+        attachment_cache.discard(attachment.id)
+        attachment_cache.release(entry["path"])
+        return None
+    return entry
+
+
+async def download_attachment(attachment) -> str:
+    """
+    Return a local path with the content of a Jira attachment, downloading it only
+    when it is not in the attachment cache (or, with revalidation, has changed).
+    The file is pinned in the cache until release_attachments is called with its path.
+    """
+    lock = _attachment_locks.setdefault(attachment.id, asyncio.Lock())
+    async with lock:
+        # Pinned by the cache itself, so other downloads cannot evict it while this one awaits
+        entry = await _cached_file(attachment)
+        if entry is not None and not (JIRA_ATTACHMENT_REVALIDATE and entry["etag"]):
+            attachment_cache.touch(attachment.id)
+            logger.info(f"Using cached attachment {attachment.id} ({attachment.filename})")
+            return entry["path"]
+
+        temp_path = attachment_cache.temp_path()
+        try:
+            result = await download_file(attachment.contentUrl, temp_path, etag=entry["etag"] if entry else None)
+            if result is None:
+                attachment_cache.touch(attachment.id)
+                logger.info(f"Attachment {attachment.id} ({attachment.filename}) not modified, using cached copy")
+                return entry["path"]
+
+            sha256, size, etag = result
+            logger.info(f"Downloaded attachment {attachment.id} ({attachment.filename}, {size} bytes)")
+            path = attachment_cache.store(attachment.id, attachment.filename, temp_path, sha256, size, etag)
+            if entry is not None:
+                # The run uses the new download, not the previously cached copy
+                attachment_cache.release(entry["path"])
+            return path
+        except BaseException:
+            if entry is not None:
+                attachment_cache.release(entry["path"])
+            raise
+        finally:
+            # Only left behind when the download failed or was not needed
+            temp_path.unlink(missing_ok=True)
+
+
+async def download_attachments(*attachments) -> List[Optional[str]]:
+    """
+    Download attachments concurrently.
+
+    Args:
+        attachments: Objects with id, contentUrl and filename, None entries are skipped
+
+    Returns:
+        The local file path of each attachment, None for skipped entries, in argument order.
+        The files are pinned in the cache, pass the paths to release_attachments when done.
+    """
+    async def _download(attachment) -> Optional[str]:
+        if attachment is None:
+            return None
+        return await download_attachment(attachment)
+
+    results = await asyncio.gather(*[_download(attachment) for attachment in attachments], return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # The run will not use the attachments that did download
+        release_attachments(*[result for result in results if isinstance(result, str)])
+        raise errors[0]
+    return list(results)
+
+
+def release_attachments(*paths: Optional[str]):
+    """Unpin files returned by download_attachments once the run using them is done"""
+    attachment_cache.release(*paths)
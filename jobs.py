@@ -0,0 +1,185 @@
+"""
+In-process job queue for agent runs: a bounded queue served by a fixed pool of workers,
+with per-job status, current node and final state for polling.
+"""
+
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+# Finished jobs kept around for polling before the oldest ones are dropped
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "200"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Job(BaseModel):
+    """Status record for one agent run"""
+    id: str
+    issue_key: Optional[str] = None
+    status: str = QUEUED
+    current_node: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None  # Custom progress reported by the nodes, e.g. streamed collection items
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def run_graph_with_progress(graph, state: Dict[str, Any], job: Job) -> Dict[str, Any]:
+    """
+    Stream a compiled graph (including its subgraphs) to completion, recording the node
+    that is currently executing and the progress reported by nodes through LangGraph's
+    stream writer on the job. Returns the final state of the root graph.
+    """
+    final_state = None
+    async for namespace, mode, chunk in graph.astream(
+        state, stream_mode=["updates", "values", "custom"], subgraphs=True
+    ):
+        if mode == "values":
+            if not namespace:
+                final_state = chunk
+            continue
+
+        if mode == "custom":
+            if isinstance(chunk, dict):
+                job.progress = {**(job.progress or {}), **chunk}
+            continue
+
+        # namespace entries look like "postman_agent:<task id>", keep the node names only
+        path = [part.split(":")[0] for part in namespace]
+        path = [part for part in path if not part.isdigit()]
+        for node_name in chunk:
+            job.current_node = "/".join([*path, node_name])
+
+    return final_state
+
+
+class JobQueue:
+    """Bounded queue of agent runs served by a fixed number of worker tasks"""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue_size: int = JOB_QUEUE_SIZE, history_size: int = JOB_HISTORY_SIZE):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.history_size = history_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    async def start(self):
+        """Create the queue and spawn the worker tasks on the running event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Job queue started with {self.workers} workers and queue size {self.max_queue_size}")
+
+    async def stop(self):
+        """Cancel the worker tasks, jobs still queued are abandoned"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        logger.info("Job queue stopped")
+
+    def submit(self, run: Callable[[Job], Awaitable[Dict[str, Any]]], issue_key: Optional[str] = None) -> Job:
+        """
+        Enqueue a run and return its job record immediately.
+
+        Args:
+            run: Coroutine function executing the run, it receives the job to report progress on
+            issue_key: Jira issue the run belongs to
+
+        Raises:
+            QueueFullError: if the queue is at capacity
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue has not been started")
+
+        job = Job(id=uuid.uuid4().hex, issue_key=issue_key, created_at=_now())
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queue_size} jobs waiting)")
+
+        self._jobs[job.id] = job
+        logger.info(f"Queued job {job.id} for issue {issue_key}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def stats(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "max_queue_size": self.max_queue_size,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            **counts,
+        }
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, run = await self._queue.get()
+            try:
+                await self._execute(job, run)
+            finally:
+                self._queue.task_done()
+                self._prune_history()
+
+    async def _execute(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]]):
+        job.status = RUNNING
+        job.started_at = _now()
+        logger.info(f"Job {job.id} started")
+        try:
+            result = await run(job)
+            job.result = result
+            job.status = FAILED if (result or {}).get("status") == "error" else COMPLETED
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = "Job was cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = _now()
+            logger.info(f"Job {job.id} finished with status {job.status}")
+
+    def _prune_history(self):
+        """Drop the oldest finished jobs once more than history_size are retained"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (COMPLETED, FAILED)]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+
+job_queue = JobQueue()
@@ -0,0 +1,187 @@
+"""
+Persistent SQLite LLM response cache (a LangChain BaseCache) with a TTL and a byte budget.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Union
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.messages.utils import message_chunk_to_message
+from langchain_core.outputs import ChatGeneration
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Comma separated node names that never use the cache, e.g. "data_agent,create_collection"
+LLM_CACHE_DISABLED_NODES = {node.strip() for node in os.getenv("LLM_CACHE_DISABLED_NODES", "").split(",") if node.strip()}
+
+
+def _cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseCache(BaseCache):
+    """LangChain cache of model responses in SQLite, with a TTL and a size cap"""
+
+    def __init__(self, path: str, ttl: float, max_bytes: int):
+        """
+        Args:
+            path: SQLite database file, created with its directory if missing
+            ttl: Seconds a response stays valid after it was stored
+            max_bytes: Budget for the summed size of the stored responses
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # One connection shared by the worker threads LangChain runs lookups on
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] + self.ttl <= now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        try:
+            return [loads(generation) for generation in json.loads(row[0])]
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cached response: {e}")
+            with self._lock:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = json.dumps([dumps(generation) for generation in return_val])
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (_cache_key(prompt, llm_string), value, size, now, now),
+            )
+            self._evict()
+
+    def clear(self, **kwargs: Any) -> int:
+        """Remove every stored response, returns how many were removed"""
+        with self._lock:
+            return self._connection.execute("DELETE FROM responses").rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "name": "llm",
+            "enabled": True,
+            "size": count,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "disabled_nodes": sorted(LLM_CACHE_DISABLED_NODES),
+        }
+
+    def _evict(self):
+        # Callers must hold the lock
+        self._connection.execute("DELETE FROM responses WHERE created_at + ? <= ?", (self.ttl, time.time()))
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+llm_cache: Optional[SQLiteResponseCache] = (
+    SQLiteResponseCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES) if LLM_CACHE_ENABLED else None
+)
+
+
+def llm_cache_for(node: str) -> Union[SQLiteResponseCache, bool]:
+    """The cache= argument for a model used by node, False when caching is disabled for it"""
+    if llm_cache is None or node in LLM_CACHE_DISABLED_NODES:
+        return False
+    return llm_cache
+
+
+async def astream_cached(model, messages: Sequence[BaseMessage], refresh: bool = False) -> AsyncIterator[AIMessageChunk]:
+    """
+    model.astream(messages) going through the model's response cache, which LangChain
+    only consults for invoke/ainvoke. A hit is replayed as a single chunk. A streamed
+    response is stored once the stream has been consumed to the end without being cut
+    off at max_tokens, so a stream the caller abandons early is never cached.
+
+    Args:
+        model: Chat model, its cache attribute decides whether the cache is used
+        messages: Input messages
+        refresh: Skip the lookup but store the new response, for retries after a bad cached one
+    """
+    cache = getattr(model, "cache", None)
+    if not isinstance(cache, BaseCache):
+        cache = None
+    if cache is None:
+        async with aclosing(model.astream(messages)) as stream:
+            async for chunk in stream:
+                yield chunk
+        return
+
+    # Same key LangChain uses for ainvoke, so both paths share entries
+    llm_string = model._get_llm_string()
+    prompt = dumps([message.model_copy(update={"id": None}) if getattr(message, "id", None) is not None else message for message in messages])
+
+    if not refresh:
+        cached = await cache.alookup(prompt, llm_string)
+        if cached:
+            message = cached[0].message
+            yield AIMessageChunk(content=message.content, response_metadata=message.response_metadata)
+            return
+
+    accumulated: Optional[AIMessageChunk] = None
+    async with aclosing(model.astream(messages)) as stream:
+        async for chunk in stream:
+            accumulated = chunk if accumulated is None else accumulated + chunk
+            yield chunk
+
+    if accumulated is not None and accumulated.response_metadata.get("stop_reason") != "max_tokens":
+        await cache.aupdate(prompt, llm_string, [ChatGeneration(message=message_chunk_to_message(accumulated))])
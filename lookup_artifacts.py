@@ -0,0 +1,135 @@
+"""
+NDJSON artifacts of data lookups and their compact rendering for prompts.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+import aiofiles
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+LOOKUP_ARTIFACTS_DIR = os.getenv("LOOKUP_ARTIFACTS_DIR", os.path.join("artifacts", "lookups"))
+
+
+def lookup_record(lookup_query: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """The artifact record of one data search sub-agent result"""
+    last = result.get("last_query_result") or {}
+    # Only rows returned by execute_sql are data, a trailing describe_table returns schema rows
+    is_sql = last.get("tool_name") == "execute_sql"
+    rows = last.get("data") if is_sql and isinstance(last.get("data"), list) else []
+    return {
+        "query": lookup_query,
+        "status": result.get("status", "failed"),
+        "reasoning": result.get("reasoning", ""),
+        "sql": last.get("query") if is_sql else None,
+        "rows": rows,
+        "row_count": len(rows),
+        "truncated": bool(last.get("truncated")) if is_sql else False,
+    }
+
+
+async def write_lookup_artifact(records: List[Dict[str, Any]]) -> str:
+    """
+    Write lookup records as NDJSON to a new file, atomically.
+
+    Returns:
+        The path of the artifact, unique even for runs started in the same second
+    """
+    os.makedirs(LOOKUP_ARTIFACTS_DIR, exist_ok=True)
+    name = f"lookups_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.ndjson"
+    path = os.path.join(LOOKUP_ARTIFACTS_DIR, name)
+    temp_path = os.path.join(LOOKUP_ARTIFACTS_DIR, f".{name}.tmp")
+    async with aiofiles.open(temp_path, "w", encoding="utf-8") as f:
+        await f.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records))
+    os.replace(temp_path, path)
+    return path
+
+
+async def read_lookup_records(path: str) -> List[Dict[str, Any]]:
+    """Records of an NDJSON lookup artifact, lines that are not JSON objects are skipped"""
+    records = []
+    async with aiofiles.open(path, "r", encoding="utf-8") as f:
+        async for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping a malformed line in {path}")
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+    return records
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return str(value).replace("\n", " ").replace("|", "\\|")
+
+
+def _table(rows: List[Any]) -> Tuple[List[str], int]:
+    """Lines of a compact table of rows (header first) and the number of duplicate rows dropped"""
+    # Union of the row keys in first-seen order
+    columns = list(dict.fromkeys(column for row in rows if isinstance(row, dict) for column in row))
+
+    lines = [" | ".join(columns)] if columns else []
+    seen = set()
+    for row in rows:
+        line = " | ".join(_cell(row.get(column)) for column in columns) if isinstance(row, dict) else _cell(row)
+        if line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return lines, len(rows) - len(seen)
+
+
+def render_lookup_records(records: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """
+    Compact text of lookup records for the prompt.
+
+    Returns:
+        The text and rendering statistics (lookups, rows, duplicate rows dropped, repeated result sets)
+    """
+    lines: List[str] = []
+    failed: List[str] = []
+    rendered_sets: Dict[str, str] = {}  # rendered rows -> first lookup that returned them
+    stats = {"lookups": len(records), "rows": 0, "duplicate_rows": 0, "repeated_results": 0}
+
+    for record in records:
+        query = str(record.get("query", ""))
+        if record.get("status") != "found":
+            failed.append(f"{query}: {record.get('reasoning', '')}")
+            continue
+
+        rows = record.get("rows") or []
+        stats["rows"] += len(rows)
+        table, duplicates = _table(rows)
+        stats["duplicate_rows"] += duplicates
+        note = " (truncated, more rows exist)" if record.get("truncated") else ""
+        if not table:
+            lines.extend([f"{query}:", "  No data returned", ""])
+            continue
+
+        body = "\n".join(table)
+        if body in rendered_sets:
+            stats["repeated_results"] += 1
+            lines.extend([f"{query}: same rows as \"{rendered_sets[body]}\"", ""])
+            continue
+        rendered_sets[body] = query
+        lines.append(f"{query} ({len(rows) - duplicates} rows{note}):")
+        lines.extend(f"  {line}" for line in table)
+        lines.append("")
+
+    text = "\n".join(lines)
+    if failed:
+        text += "\n\nFAILED LOOKUPS:\n" + "\n".join(failed)
+    return text, stats
@@ -0,0 +1,78 @@
+"""
+A persistent event loop in a daemon thread, which sync and async callers submit coroutines to.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class LoopRunner:
+    """An asyncio event loop running in a dedicated daemon thread"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Start the loop thread if it is not already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def _serve():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=_serve, name=f"{self.name}-loop", daemon=True)
+            self._thread.start()
+            started.wait()
+            logger.info(f"Started {self.name} event loop thread")
+
+    def stop(self):
+        """Stop the loop and wait for its thread to exit"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+            logger.info(f"Stopped {self.name} event loop thread")
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop and return a thread-safe future for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread until it finishes"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError(f"LoopRunner.run called from the {self.name} loop thread, await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    async def arun(self, coro: Coroutine) -> Any:
+        """Await a coroutine on the loop from any other event loop"""
+        if self.in_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
@@ -1,11 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from main_agent import main_agent
+from jobs import Job, QueueFullError, job_queue, run_graph_with_progress
+from database_tools import MCP_TOOLBOX_URL, mcp_loop, mcp_sessions, schema_cache, query_cache, invalidate_schema_cache
+from jira_attachments import attachment_cache, download_attachments, release_attachments, jira_sessions
+from spec_store import spec_store
+from llm_cache import llm_cache
+import prompt_caching
+from storage_backends import storage_backend
 from pydantic import BaseModel
-from pathlib import Path
-import aiohttp
-import os
+from contextlib import asynccontextmanager
+from typing import Optional
 import aiofiles
-from datetime import datetime
 from logging_utils import setup_logging
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,11 +18,18 @@ load_dotenv()
 # Configure logging
 logger = setup_logging(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await mcp_loop.arun(mcp_sessions.open(MCP_TOOLBOX_URL))
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await jira_sessions.close()
+    attachment_cache.flush()
+    await mcp_loop.arun(mcp_sessions.close())
+    mcp_loop.stop()
 
-# Create downloads directory
-DOWNLOAD_DIR = Path("downloads")
-DOWNLOAD_DIR.mkdir(exist_ok=True)
+app = FastAPI(lifespan=lifespan)
 
 # Simple models
 class Attachment(BaseModel):
@@ -34,6 +46,7 @@ class IssueRequest(BaseModel):
     openapi_spec: Attachment
     postman_collection: Attachment = None
     user_req: Attachment = None
+    use_query_cache: bool = True
 
 task_mapping = {
     "Enhance Test Collection": "enhance_collection", 
@@ -43,53 +56,17 @@ task_mapping = {
     "Validate OpenAPI Spec": "validate_openapi_spec"  # Handle both capitalizations
 }
 
-# Jira credentials from environment
-JIRA_TOKEN = os.getenv("JIRA_API_TOKEN")
-JIRA_EMAIL = os.getenv("JIRA_EMAIL")
-
-async def download_file(url: str, filename: str) -> str:
-    """Download file from URL and save locally"""
-    # Basic auth for Jira
-    import base64
-    auth = base64.b64encode(f"{JIRA_EMAIL}:{JIRA_TOKEN}".encode()).decode()
-    
-    headers = {"Authorization": f"Basic {auth}"}
-    
-    # Create unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_filename = f"{timestamp}_{filename}"
-    file_path = DOWNLOAD_DIR / safe_filename
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                logger.error(f"Failed to download: {response.status}")
-                raise HTTPException(status_code=400, detail=f"Failed to download: {response.status}")
-            
-            async with aiofiles.open(file_path, 'wb') as f:
-                async for chunk in response.content.iter_chunked(8192):
-                    await f.write(chunk)
-    return str(file_path)
-
-@app.post("/run-testing-agent/")
-async def run_testing_agent(issue: IssueRequest):
+async def run_pipeline(issue: IssueRequest, job: Job) -> dict:
+    """Download the Jira attachments and run the main agent for one issue"""
     try:
-        # Find the first JSON attachment
-        spec_attachment = issue.openapi_spec
-        collection_attachment = issue.postman_collection or None
-        req_attachment = issue.user_req or None
         task = task_mapping[issue.postmanAction]
-    
-        spec_file_path = await download_file(spec_attachment.contentUrl, spec_attachment.filename)
-        
-        # Only download collection and requirements files if they exist
-        collection_file_path = None
-        if collection_attachment:
-            collection_file_path = await download_file(collection_attachment.contentUrl, collection_attachment.filename)
-            
-        req_file_path = None
-        if req_attachment:
-            req_file_path = await download_file(req_attachment.contentUrl, req_attachment.filename)
+
+        # Fetch all attachments concurrently, collection and requirements files are optional
+        spec_file_path, collection_file_path, req_file_path = await download_attachments(
+            issue.openapi_spec,
+            issue.postman_collection or None,
+            issue.user_req or None,
+        )
     
     except Exception as e:
         return {
@@ -97,29 +74,96 @@ async def run_testing_agent(issue: IssueRequest):
             "message": f"Issue while downloading files from JIRA {e}" 
         }
 
-    # Read the contents of the requirements file
-    test_data_scenario = ""
-    if req_file_path:
-        try:
-            with open(req_file_path, 'r', encoding='utf-8') as f:
-                test_data_scenario = f.read()
-        except Exception as e:
-            logger.error(f"Failed to read requirements file: {e}")
-            test_data_scenario = ""
-
-    initial_state = {
-        "task": task, 
-        "spec_fpath": spec_file_path,
-        "api_name": issue.apiName,
-        "existing_collection_fpath": collection_file_path,
-        "test_data_scenario": test_data_scenario
+    try:
+        # Read the contents of the requirements file
+        test_data_scenario = ""
+        if req_file_path:
+            try:
+                async with aiofiles.open(req_file_path, 'r', encoding='utf-8') as f:
+                    test_data_scenario = await f.read()
+            except Exception as e:
+                logger.error(f"Failed to read requirements file: {e}")
+                test_data_scenario = ""
+
+        initial_state = {
+            "task": task, 
+            "spec_fpath": spec_file_path,
+            "api_name": issue.apiName,
+            "existing_collection_fpath": collection_file_path,
+            "test_data_scenario": test_data_scenario,
+            "use_query_cache": issue.use_query_cache
+        }
+
+        logger.info(f"Job {job.id} initial state: {initial_state}")
+
+        return await run_graph_with_progress(main_agent, initial_state, job)
+    finally:
+        # The cache may evict the files once the run no longer reads them
+        release_attachments(spec_file_path, collection_file_path, req_file_path)
+
+@app.post("/run-testing-agent/", status_code=202)
+async def run_testing_agent(issue: IssueRequest):
+    if issue.postmanAction not in task_mapping:
+        raise HTTPException(status_code=400, detail=f"Unknown postmanAction: {issue.postmanAction}")
+
+    try:
+        job = job_queue.submit(lambda job: run_pipeline(issue, job), issue_key=issue.issueKey)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}"
     }
 
-    print(initial_state)
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.get("/jobs")
+def list_jobs():
+    return {
+        "queue": job_queue.stats(),
+        "jobs": [job.model_dump(exclude={"result"}) for job in job_queue.list()]
+    }
+
+@app.get("/admin/cache")
+def cache_stats():
+    return {
+        "schema": schema_cache.stats(),
+        "query": query_cache.stats(),
+        "attachments": attachment_cache.stats(),
+        "spec": spec_store.stats(),
+        "llm": llm_cache.stats() if llm_cache else {"name": "llm", "enabled": False},
+        "prompt": prompt_caching.stats(),
+        "storage": storage_backend.stats()
+    }
+
+@app.post("/admin/cache/schema/invalidate")
+def invalidate_schema(table_name: Optional[str] = None):
+    """Drop cached schema metadata for one table, or for every table when none is given"""
+    removed = invalidate_schema_cache(table_name)
+    logger.info(f"Invalidated {removed} schema cache entries (table: {table_name or 'all'})")
+    return {"invalidated": removed}
+
+@app.post("/admin/cache/query/invalidate")
+def invalidate_queries():
+    """Drop every cached execute_sql result"""
+    removed = query_cache.invalidate()
+    logger.info(f"Invalidated {removed} query cache entries")
+    return {"invalidated": removed}
 
-    result = main_agent.invoke(initial_state)
-    return result
+@app.post("/admin/cache/llm/invalidate")
+def invalidate_llm_responses():
+    """Drop every cached LLM response"""
+    removed = llm_cache.clear() if llm_cache else 0
+    logger.info(f"Invalidated {removed} LLM response cache entries")
+    return {"invalidated": removed}
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
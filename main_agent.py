@@ -22,21 +22,21 @@ def decide_workflow(state: AgentState) -> Command[Literal["test_data_agent", "po
         logger.info("Task does not require data enhancement - routing directly to postman_agent")
         return Command(goto="postman_agent")
 
-def run_test_data_agent(state: AgentState):
+async def run_test_data_agent(state: AgentState):
     """
     Wrapper node to run the test data agent and return its results
     """
     logger.info("Running test data agent...")
-    result = test_data_agent.invoke(state)
+    result = await test_data_agent.ainvoke(state)
     logger.info(f"Test data agent completed. Data file: {result.get('data_filepath', 'N/A')}")
     return result
 
-def run_postman_agent(state: AgentState):
+async def run_postman_agent(state: AgentState):
     """
     Wrapper node to run the postman agent and return its results
     """
     logger.info("Running postman agent...")
-    result = postman_agent.invoke(state)
+    result = await postman_agent.ainvoke(state)
     logger.info(f"Postman agent completed. Status: {result.get('status', 'N/A')}")
     return result
 
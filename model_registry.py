@@ -0,0 +1,84 @@
+"""
+Process-wide registry of chat models, structured-output bindings and response schemas, built once per node.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Hashable, Tuple, Type, Union
+from langchain.chat_models import init_chat_model
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+from llm_cache import llm_cache_for
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+# init_chat_model arguments of each node, every node uses temperature 0 so cached responses stay valid
+MODEL_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "get_requirements": {"model": "gpt-4o-mini", "model_provider": "openai", "temperature": 0.0},
+    "data_agent": {"model": "gpt-4o", "model_provider": "openai", "temperature": 0.0},
+    "create_collection": {"model": "claude-sonnet-4-20250514", "model_provider": "anthropic", "max_tokens": 20000, "temperature": 0},
+    "enhance_collection": {"model": "gpt-4o", "model_provider": "openai", "temperature": 0.0},
+    "enhance_collection_with_data": {"model": "gpt-4o", "model_provider": "openai", "temperature": 0.0},
+}
+RESPONSE_SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_schemas")
+
+_lock = threading.Lock()
+_models: Dict[str, BaseChatModel] = {}
+_structured_models: Dict[Tuple[Hashable, ...], Runnable] = {}
+_response_schemas: Dict[str, Dict[str, Any]] = {}
+
+
+def get_model(node: str) -> BaseChatModel:
+    """The chat model of node, built on first use"""
+    with _lock:
+        model = _models.get(node)
+        if model is None:
+            config = MODEL_CONFIGS[node]
+            logger.info(f"Initialising {config['model']} for {node}")
+            model = init_chat_model(**config, cache=llm_cache_for(node))
+            _models[node] = model
+        return model
+
+
+def load_response_schema(name: str) -> Dict[str, Any]:
+    """A JSON schema from response_schemas/<name>.json, read from disk once"""
+    with _lock:
+        schema = _response_schemas.get(name)
+        if schema is None:
+            schema_path = os.path.join(RESPONSE_SCHEMAS_DIR, f"{name}.json")
+            logger.info(f"Loading response schema from: {schema_path}")
+            with open(schema_path, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+            _response_schemas[name] = schema
+        return schema
+
+
+def get_structured_model(node: str, schema: Union[str, Type[BaseModel]], **kwargs) -> Runnable:
+    """
+    node's model bound with with_structured_output, built on first use.
+
+    Args:
+        node: Node name in MODEL_CONFIGS
+        schema: A Pydantic model, or the name of a JSON schema in response_schemas/
+        **kwargs: Further with_structured_output arguments, e.g. method="json_schema", strict=True
+
+    Returns:
+        The shared structured-output runnable, returning a Pydantic instance or a dict
+    """
+    key = (node, schema, *sorted(kwargs.items()))
+    with _lock:
+        structured_model = _structured_models.get(key)
+    if structured_model is not None:
+        return structured_model
+
+    model = get_model(node)
+    resolved = load_response_schema(schema) if isinstance(schema, str) else schema
+    structured_model = model.with_structured_output(resolved, **kwargs)
+    with _lock:
+        # Another thread may have bound it meanwhile, keep the first one
+        return _structured_models.setdefault(key, structured_model)
+
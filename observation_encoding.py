@@ -0,0 +1,135 @@
+"""
+Compact encodings of execute_sql rows and table schemas for the data search agent's observations.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+OBSERVATION_FORMAT = os.getenv("OBSERVATION_FORMAT", "tsv")
+
+RowEncoder = Callable[[List[Dict[str, Any]]], str]
+
+
+def _columns(rows: List[Dict[str, Any]]) -> List[str]:
+    """Union of the row keys, in order of first appearance"""
+    return list(dict.fromkeys(key for row in rows for key in row))
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, separators=(",", ":"), default=str)
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+def encode_rows_tsv(rows: List[Dict[str, Any]]) -> str:
+    """Header row of column names followed by one tab separated line per row"""
+    columns = _columns(rows)
+    lines = ["\t".join(columns)]
+    lines.extend("\t".join(_cell(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def encode_rows_csv(rows: List[Dict[str, Any]]) -> str:
+    """Header row of column names followed by one CSV line per row"""
+    columns = _columns(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows([[_cell(row.get(column)) for column in columns] for row in rows])
+    return buffer.getvalue().rstrip("\n")
+
+
+def encode_rows_columnar(rows: List[Dict[str, Any]]) -> str:
+    """Compact JSON object mapping each column name to the list of its values"""
+    columns = _columns(rows)
+    return json.dumps(
+        {column: [row.get(column) for row in rows] for column in columns},
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def encode_rows_repr(rows: List[Dict[str, Any]]) -> str:
+    """The legacy Python repr, kept for comparison"""
+    return str(rows)
+
+
+ROW_ENCODERS: Dict[str, RowEncoder] = {
+    "tsv": encode_rows_tsv,
+    "csv": encode_rows_csv,
+    "columnar": encode_rows_columnar,
+    "repr": encode_rows_repr,
+}
+
+
+def register_row_encoder(name: str, encoder: RowEncoder):
+    """Make a custom row encoder selectable through OBSERVATION_FORMAT"""
+    ROW_ENCODERS[name] = encoder
+
+
+def encode_schema(columns: List[Dict[str, Any]]) -> str:
+    """
+    One line per column from information_schema style rows, e.g.
+    "naptan varchar PK NOT NULL -- station id". Unknown layouts fall back to TSV.
+    """
+    if not columns or not all("COLUMN_NAME" in column for column in columns):
+        return encode_rows_tsv(columns)
+
+    lines = []
+    for column in columns:
+        parts = [str(column["COLUMN_NAME"]), str(column.get("COLUMN_TYPE") or column.get("DATA_TYPE") or "")]
+        key = column.get("COLUMN_KEY")
+        if key == "PRI":
+            parts.append("PK")
+        elif key in ("UNI", "MUL"):
+            parts.append(key)
+        if column.get("IS_NULLABLE") == "NO":
+            parts.append("NOT NULL")
+        line = " ".join(part for part in parts if part)
+        if column.get("COLUMN_COMMENT"):
+            line += f" -- {_cell(column['COLUMN_COMMENT'])}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def encode_observation(tool_name: str, observation: Any, fmt: str = None) -> str:
+    """
+    Render a tool result as ToolMessage content.
+
+    Args:
+        tool_name: Name of the tool that produced the observation
+        observation: The dict returned by the tool
+        fmt: Row encoder name, defaults to OBSERVATION_FORMAT
+    """
+    fmt = fmt or OBSERVATION_FORMAT
+    if fmt == "repr" or not isinstance(observation, dict):
+        return str(observation)
+    encode_rows = ROW_ENCODERS.get(fmt, encode_rows_tsv)
+
+    if observation.get("status") != "success":
+        return f"status: {observation.get('status')}\nmessage: {observation.get('message')}"
+
+    data = observation.get("data")
+    lines = ["status: success"]
+    if tool_name == "describe_table":
+        lines.append(f"columns:\n{encode_schema(data or [])}")
+    elif tool_name == "describe_tables":
+        for table_name, columns in (data or {}).items():
+            lines.append(f"table {table_name}:\n{encode_schema(columns)}")
+        for table_name, message in (observation.get("errors") or {}).items():
+            lines.append(f"table {table_name}: error {message}")
+    elif isinstance(data, list):
+        lines.append(f"rows: {len(data)}")
+        if data:
+            lines.append(encode_rows(data))
+        if observation.get("note"):
+            lines.append(f"note: {observation['note']}")
+    else:
+        lines.append(json.dumps(data, separators=(",", ":"), default=str))
+    return "\n".join(lines)
@@ -3,9 +3,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-from google.cloud import storage
+from storage_backends import storage_backend
 from states import AgentState
-from utils import validate_json_spec
+from spec_store import load_spec
 from typing_extensions import Literal
 from langgraph.types import Command
 from langgraph.graph import StateGraph, START, END
@@ -17,7 +17,7 @@ from logging_utils import setup_logging
 # Get a logger for this tools module using our improved setup
 tools_logger = setup_logging(__name__)
 
-def validate_openapi_spec(state: AgentState) -> Command[Literal["generate_new_postman_tests_with_data", "generate_new_postman_collection", "enhance_postman_collection", "__end__"]]:
+async def validate_openapi_spec(state: AgentState) -> Command[Literal["generate_new_postman_tests_with_data", "generate_new_postman_collection", "enhance_postman_collection", "__end__"]]:
     """
     Validates an OpenAPI specification file.
     
@@ -31,7 +31,13 @@ def validate_openapi_spec(state: AgentState) -> Command[Literal["generate_new_po
     tools_logger.info(f"Validating OpenAPI spec at: {spec_path}")
     
     
-    validation_json = validate_json_spec(spec_path)
+    # The spec is parsed and validated once per distinct content, off the event loop,
+    # and the artifact is reused by the generation nodes and by later requests
+    try:
+        validation_json = (await load_spec(spec_path)).validation
+    except Exception as e:
+        tools_logger.error(f"Could not read OpenAPI spec {spec_path}: {e}")
+        validation_json = {"status": "error", "result": "invalid", "message": f"Could not read OpenAPI spec {spec_path}: {e}"}
     
     if validation_json["status"] == "success":
         tools_logger.info(f"OpenAPI spec from {spec_path} is valid.")
@@ -75,9 +81,10 @@ def validate_openapi_spec(state: AgentState) -> Command[Literal["generate_new_po
         )
       
 
-def upload_to_gcp_bucket(state: AgentState):
+async def upload_to_gcp_bucket(state: AgentState):
     """
-    Uploads a file to a Google Cloud Storage bucket.
+    Uploads a file to the storage backend (a Google Cloud Storage bucket unless STORAGE_BACKEND=local),
+    skipped when an identical collection is already stored for the API.
     
     Args:
         file_path: Local path to the file to upload
@@ -91,24 +98,26 @@ def upload_to_gcp_bucket(state: AgentState):
     api_name = state["api_name"]
     
     try:
-        # Initialize the client
-        client = storage.Client()
-        bucket_name = os.getenv('GCS_BUCKET_NAME')
-        
-        bucket = client.bucket(bucket_name)
-        file_name = os.path.basename(file_path)
-        
-        # Create the blob path with api_name as folder
-        blob_path = f"{api_name}/{file_name}"
-        blob = bucket.blob(blob_path)
-        
-        # Upload the file
-        blob.upload_from_filename(file_path, content_type='application/json')
-        tools_logger.info(f"File uploaded to GCS: gs://{bucket_name}/{blob_path}")
+        # The api_name is the folder, gzip output (COLLECTION_OUTPUT_FORMAT=gzip) is stored compressed and served as JSON
+        result = await storage_backend.aupload(
+            file_path,
+            f"{api_name}/{os.path.basename(file_path)}",
+            content_type='application/json',
+            content_encoding='gzip' if file_path.endswith('.gz') else None
+        )
+
+        if result["skipped"]:
+            tools_logger.info(f"Collection unchanged, already stored at {result['uri']}")
+            return {
+                "status": "success",
+                "reasoning": f"Postman collection is identical to the one already stored at {result['uri']}, upload skipped"
+            }
+
+        tools_logger.info(f"File uploaded to {storage_backend.name}: {result['uri']}")
         
         return {
             "status": "success",
-            "reasoning": f"New postman collection uploaded successfully to gs://{bucket_name}/{blob_path}"
+            "reasoning": f"New postman collection uploaded successfully to {result['uri']}"
         }
         
     except Exception as e:
@@ -0,0 +1,94 @@
+"""
+Cache-friendly prompt layout (instructions, then spec, then per-request data) and prompt cache usage reporting.
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from model_registry import MODEL_CONFIGS
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+# Emit Anthropic cache_control breakpoints, the message order is cache-friendly either way
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "true").lower() == "true"
+CACHE_CONTROL = {"type": "ephemeral"}
+
+_lock = threading.Lock()
+_usage: Dict[str, Dict[str, int]] = {}
+
+
+def _text_block(text: str, breakpoint: bool) -> Dict[str, Any]:
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if breakpoint:
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+def layered_messages(node: str, system_prompt: str, spec_block: str, request_block: str) -> List[BaseMessage]:
+    """
+    Messages for node's model in cache-friendly order.
+
+    Args:
+        node: Node name in model_registry.MODEL_CONFIGS, decides the provider specific layout
+        system_prompt: Static instructions, identical for every request
+        spec_block: The OpenAPI spec, shared by requests on the same spec
+        request_block: Everything specific to this request
+
+    Returns:
+        A system message with the instructions and a human message with the spec followed by the request
+    """
+    provider = MODEL_CONFIGS[node]["model_provider"]
+    if provider != "anthropic" or not PROMPT_CACHING:
+        return [SystemMessage(content=system_prompt), HumanMessage(content=f"{spec_block}\n\n{request_block}")]
+
+    return [
+        SystemMessage(content=[_text_block(system_prompt, breakpoint=True)]),
+        HumanMessage(content=[
+            _text_block(spec_block, breakpoint=True),
+            _text_block(request_block, breakpoint=False),
+        ]),
+    ]
+
+
+def record_cache_usage(node: str, usage_metadata: Optional[Dict[str, Any]]):
+    """Log and accumulate the prompt cache token counts of one model response"""
+    if not usage_metadata:
+        return
+    details = usage_metadata.get("input_token_details") or {}
+    input_tokens = usage_metadata.get("input_tokens") or 0
+    cache_read = details.get("cache_read") or 0
+    cache_creation = details.get("cache_creation") or 0
+
+    with _lock:
+        totals = _usage.setdefault(node, {"calls": 0, "input_tokens": 0, "cache_read": 0, "cache_creation": 0})
+        totals["calls"] += 1
+        totals["input_tokens"] += input_tokens
+        totals["cache_read"] += cache_read
+        totals["cache_creation"] += cache_creation
+
+    logger.info(f"{node}: {input_tokens} input tokens, {cache_read} read from the prompt cache, {cache_creation} written to it")
+
+
+def unwrap_structured(node: str, result: Dict[str, Any]) -> Any:
+    """
+    The parsed output of a with_structured_output(..., include_raw=True) call, after
+    recording the cache usage of its raw message.
+
+    Raises:
+        The parsing error of the structured output, as the call without include_raw would
+    """
+    record_cache_usage(node, getattr(result.get("raw"), "usage_metadata", None))
+    if result.get("parsing_error") is not None:
+        raise result["parsing_error"]
+    return result["parsed"]
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        nodes = {node: dict(totals) for node, totals in _usage.items()}
+    for totals in nodes.values():
+        totals["read_ratio"] = round(totals["cache_read"] / totals["input_tokens"], 3) if totals["input_tokens"] else 0.0
+    return {"name": "prompt", "enabled": PROMPT_CACHING, "nodes": nodes}
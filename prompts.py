@@ -42,13 +42,15 @@ AVAILABLE TABLES IN DATABASE:
 
 TOOLS YOU CAN USE:
 1. describe_table(table_name) - Returns the schema of a table
-2. execute_sql(query) - Executes a SELECT query and returns results
-3. mark_complete(status) - Mark task as complete when done
+2. describe_tables(table_names) - Returns the schemas of several tables in one call
+3. execute_sql(query) - Executes a SELECT query and returns results
+4. mark_complete(status) - Mark task as complete when done
 
 INSTRUCTIONS:
 1. Analyze what you know so far from the conversation history
 2. Decide your next action:
    - If you need to understand a table's structure, call describe_table with the table name
+   - If you need to understand several tables, call describe_tables once with all of their names
    - If you know enough to query, call execute_sql with a SELECT statement
    - If you found the data needed, call mark_complete with status="found"
    - If you've exhausted options and cannot find the data, call mark_complete with status="failed"
@@ -58,6 +60,7 @@ IMPORTANT:
 - Learn from previous attempts shown in the conversation history - don't repeat the same queries
 - ONLY generate SELECT statements for execute_sql - NO INSERT, UPDATE, DELETE, DROP, or other modifications.
 - Only query tables you've explored the schema for
+- Query results are capped to a limited number of rows, select only the columns you need and filter with WHERE
 - Be decisive - if a query returned good data, mark as complete
 """
 
@@ -102,7 +105,7 @@ generate_postman_collection_sys_prompt = """
           have those values should expect a 300 status code response. 
         - For path parameters (parameters that are part of the URL path), use realistic example 
           values instead of variables. 
-        - For date parameters with constraints, use today's date {date} as reference when needed  
+        - For date parameters with constraints, use today's date (given after the specification) as reference when needed  
         - The url should be provided as a variable called base_url with placeholder value "your_base_url_here" 
         and api_key should be provided as a variable called app_key with placeholder value "your_api_key_here" 
         in Postman that can be used when generating the collection.
@@ -117,42 +120,52 @@ generate_postman_collection_sys_prompt = """
 
 """
 
+# The static system prompts above and below are followed by the spec and then by the
+# per-request data, in that order, so providers can reuse the cached prompt prefix
+openapi_spec_prompt = """
+    OpenAPI specification :
+    {openapi_spec_doc}
+"""
+
+generate_postman_collection_request_prompt = """
+    Today's date is {date}.
+"""
+
 plan_functional_test_cases_sys_prompt = """
     You are an expert API tester. Your task is to identify new test cases to add to an existing Postman Collection based on user requirements.
 
     INPUTS:
     - OpenAPI specification (single endpoint)
-    - Existing Postman Collection 
+    - Coverage report of the existing Postman Collection: per operation, the number of requests, the status 
+      codes their tests assert, the parameter values they send, what is never exercised and the existing test names
     - User requirements (specific functionality to test)
 
     PROCESS:
     1. Analyze the OpenAPI spec to understand the endpoint structure, parameters, and responses
-    2. Review the existing Postman Collection to identify what is already being tested
+    2. Review the coverage report to identify what is already being tested
     3. Identify what the user requirements specify that is NOT already covered by existing tests
     4. Create new test cases only for the uncovered user requirements
 
     OUTPUT REQUIREMENTS:
     - Respond in a valid JSON format with this exact structure:
-    {{
+    {
         "test_cases": [
             "Test case description 1",
             "Test case description 2",
             ...
         ]
-    }}
+    }
     - Each test case must address something specified in user requirements
     - Each test case must be distinct from existing tests
     - The test case should include the values of input parameters and the expected response code. 
     - If existing tests already cover all user requirements, return nothing 
     
     If no new test cases are needed, return an empty JSON object. 
-    
-    ---
-    OpenAPI specification :
-    {openapi_spec_doc}
+"""
 
-    existing Postman collection:
-    {postman_collection}
+plan_functional_test_cases_request_prompt = """
+    existing Postman collection coverage:
+    {collection_coverage}
 
     user requirements:
     {user_requirement}
@@ -176,8 +189,8 @@ functional_test_case_generation_sys_prompt = """
         3. Create Postman request with proper structure. Generate test scripts that validate the specified 
         conditions. Use naming convention: "TEST_TYPE test: description" where TEST type is Positive/Edge. 
         
-    For each test case description, one Postman Test case should be generated. An example of a Postman test case is:
-    {test_case_str}
+    For each test case description, one Postman Test case should be generated. An example of a Postman 
+    test case is given after the OpenAPI specification.
 
     NOTE:
     - Carefully read parameter descriptions in the OpenAPI specification. If a parameter 
@@ -188,10 +201,12 @@ functional_test_case_generation_sys_prompt = """
     - The url is provided as a variable called base_url and api_key is provided as a variable
     called app_key in Postman that can be used when generating the collection. 
     - No other variables are provided.  
-    
-    OpenAPI specification :
-    {openapi_spec_doc}
-    
+"""
+
+functional_test_case_generation_request_prompt = """
+    Example Postman test case:
+    {test_case_str}
+
     Test cases to generate:
     {new_tests}
 """
@@ -225,8 +240,7 @@ generate_data_test_cases_sys_prompt = """
         - Generate test scripts that validate he expected response (status code, body, error messages) - based on what is specified in the user requirement
         - For path parameters (parameters that are part of the URL path), use the actual values instead of variables
         
-    EXAMPLE TEST CASE STRUCTURE:
-    {test_case_str}
+    An example test case structure is given after the OpenAPI specification.
 
     NOTE:
     - For path parameters (parameters that are part of the URL path), use realistic example 
@@ -243,11 +257,11 @@ generate_data_test_cases_sys_prompt = """
 
     Your goal is to produce a Postman collection tests (v2.1.0 format) that comprehensively validate the behavior 
     described in the user requirement, based on the data provided 
-    
-    ---
+"""
 
-    OpenAPI specification :
-    {openapi_spec_doc}
+generate_data_test_cases_request_prompt = """
+    EXAMPLE TEST CASE STRUCTURE:
+    {test_case_str}
 
     User requirements:
     {user_requirement}
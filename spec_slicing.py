@@ -0,0 +1,304 @@
+"""
+Slice OpenAPI specs down to selected operations and the components they reference, and
+match Postman requests to spec operations.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+# Top level sections holding $ref targets, rebuilt from the closure instead of copied
+COMPONENT_SECTIONS = ("components", "definitions", "parameters", "responses")
+
+Operation = Tuple[str, str]  # (method, path template), e.g. ("get", "/stops/{id}")
+
+
+def iter_refs(node: Any) -> Iterator[str]:
+    """Every $ref value in a JSON document, including the schemas a discriminator mapping points to"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                yield ref
+            discriminator = node.get("discriminator")
+            # Swagger 2 discriminators are a plain property name and have no mapping
+            if isinstance(discriminator, dict) and isinstance(discriminator.get("mapping"), dict):
+                for target in discriminator["mapping"].values():
+                    if isinstance(target, str):
+                        # A bare schema name is short for a ref to that component schema
+                        yield target if "/" in target or target.startswith("#") else f"#/components/schemas/{target}"
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+
+def _pointer_parts(ref: str) -> Optional[List[str]]:
+    """Parts of a local JSON pointer such as #/components/schemas/Stop, None for external refs"""
+    if not ref.startswith("#/"):
+        return None
+    return [part.replace("~1", "/").replace("~0", "~") for part in ref[2:].split("/")]
+
+
+def resolve_ref(spec: Dict[str, Any], ref: str) -> Any:
+    """The node a local $ref points to, None when it is external or does not resolve"""
+    parts = _pointer_parts(ref)
+    if parts is None:
+        return None
+    node = spec
+    for part in parts:
+        if isinstance(node, dict) and part in node:
+            node = node[part]
+        elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+            node = node[int(part)]
+        else:
+            return None
+    return node
+
+
+def component_root(ref: str) -> Optional[str]:
+    """
+    The whole component a local ref points into, e.g. #/components/schemas/Pet for
+    #/components/schemas/Pet/properties/id. None for refs outside the component sections,
+    such as #/paths/~1a/get/parameters/0, which are inlined instead of copied over.
+    """
+    parts = _pointer_parts(ref)
+    if not parts or parts[0] not in COMPONENT_SECTIONS:
+        return None
+    depth = 3 if parts[0] == "components" else 2
+    if len(parts) < depth:
+        return None
+    return "#/" + "/".join(part.replace("~", "~0").replace("/", "~1") for part in parts[:depth])
+
+
+def inline_refs(spec: Dict[str, Any], node: Any, active: Tuple[str, ...] = ()) -> Any:
+    """
+    node with the local refs that point outside the component sections replaced by their
+    targets. Unchanged sub-trees are shared with node; circular, external and unresolvable
+    refs are left as they are.
+    """
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/") and component_root(ref) is None:
+            target = resolve_ref(spec, ref)
+            if target is None or ref in active:
+                return node
+            return inline_refs(spec, target, active + (ref,))
+        inlined = {key: inline_refs(spec, value, active) for key, value in node.items()}
+        return inlined if any(inlined[key] is not node[key] for key in node) else node
+    if isinstance(node, list):
+        inlined_items = [inline_refs(spec, value, active) for value in node]
+        return inlined_items if any(new is not old for new, old in zip(inlined_items, node)) else node
+    return node
+
+
+def ref_closure(spec: Dict[str, Any], root: Any) -> List[str]:
+    """Components reachable from root by local refs, following refs inside those components too"""
+    seen: Set[str] = set()
+    ordered = []
+    pending = list(iter_refs(root))
+    while pending:
+        component = component_root(pending.pop())
+        if component is None or component in seen:
+            continue
+        seen.add(component)
+        target = resolve_ref(spec, component)
+        if target is None:
+            continue
+        ordered.append(component)
+        pending.extend(iter_refs(inline_refs(spec, target)))
+    return ordered
+
+
+def _template_pattern(template: str) -> "re.Pattern":
+    segments = []
+    for segment in template.strip("/").split("/"):
+        # {param} placeholders match any single segment, also inside a segment like {id}.json
+        segments.append("".join(
+            "[^/]+" if part.startswith("{") else re.escape(part)
+            for part in re.split(r"(\{[^}]*\})", segment) if part
+        ))
+    return re.compile("/".join(segments) + "$")
+
+
+def normalize_request_path(path: str) -> str:
+    """Turn Postman variables (:id, {{id}}) into a placeholder segment, strip query and trailing /"""
+    path = path.split("?", 1)[0].strip("/")
+    segments = ["{var}" if segment.startswith(":") or segment.startswith("{{") else segment for segment in path.split("/")]
+    return "/".join(segments)
+
+
+def match_operation(spec: Dict[str, Any], method: str, path: str) -> Optional[Operation]:
+    """
+    The spec operation a request targets. The request path may carry a base path in front
+    of the template (from the server URL), so the template is matched against its tail;
+    the template with the most literal segments wins when several match.
+    """
+    method = method.lower()
+    request_path = normalize_request_path(path)
+    best, best_score = None, -1
+    for template, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict) or method not in path_item:
+            continue
+        segments = template.strip("/").split("/")
+        tail = "/".join(request_path.split("/")[-len(segments):])
+        if len(request_path.split("/")) < len(segments):
+            continue
+        if tail == template.strip("/") or _template_pattern(template).match(tail):
+            score = sum(1 for segment in segments if not segment.startswith("{"))
+            if score > best_score:
+                best, best_score = (method, template), score
+    return best
+
+
+def iter_request_items(collection: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(item, request) of every request in a Postman collection, folders included, in order"""
+    stack = list(reversed(collection.get("item") or []))
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, dict):
+            continue
+        stack.extend(reversed(item.get("item") or []))
+        request = item.get("request")
+        if not request:
+            continue
+        yield item, {"url": request} if isinstance(request, str) else request
+
+
+def request_path(request: Dict[str, Any]) -> str:
+    """URL path of a Postman request, without the host or {{base_url}} variable"""
+    url = request.get("url") or ""
+    if isinstance(url, dict):
+        path = "/".join(str(segment) for segment in url.get("path") or []) if url.get("path") else url.get("raw", "")
+    else:
+        path = url
+    if "://" in path:
+        path = urlsplit(path).path
+    elif path.startswith("{{"):
+        # Drop the {{base_url}} host variable
+        path = path.split("/", 1)[1] if "/" in path else ""
+    return path
+
+
+def resolved_request_path(request: Dict[str, Any]) -> str:
+    """request_path without the query, its :name segments replaced by their url.variable values"""
+    url = request.get("url")
+    variables = {}
+    if isinstance(url, dict):
+        for variable in url.get("variable") or []:
+            if isinstance(variable, dict) and variable.get("key") and not variable.get("disabled") and variable.get("value") is not None:
+                variables[str(variable["key"])] = str(variable["value"])
+    segments = request_path(request).split("?", 1)[0].strip("/").split("/")
+    return "/".join(variables.get(segment[1:], segment) if segment.startswith(":") else segment for segment in segments)
+
+
+def collection_requests(collection: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(method, path) of every request in a Postman collection, folders included"""
+    return [((request.get("method") or "GET").upper(), request_path(request)) for _, request in iter_request_items(collection)]
+
+
+def collection_operations(spec: Dict[str, Any], collection: Dict[str, Any]) -> List[Operation]:
+    """The spec operations exercised by a Postman collection, in order of first use"""
+    operations = (match_operation(spec, method, path) for method, path in collection_requests(collection))
+    return list(dict.fromkeys(operation for operation in operations if operation))
+
+
+def _set_pointer(document: Dict[str, Any], parts: List[str], value: Any):
+    node = document
+    for part in parts[:-1]:
+        if isinstance(node, list):
+            node = node[int(part)]
+        else:
+            node = node.setdefault(part, {})
+    if isinstance(node, list):
+        node[int(parts[-1])] = value
+    else:
+        node[parts[-1]] = value
+
+
+def slice_spec(spec: Dict[str, Any], operations: Optional[Iterable[Operation]] = None) -> Dict[str, Any]:
+    """
+    A copy of spec restricted to operations and the components they reference.
+
+    Args:
+        spec: Parsed OpenAPI (or Swagger 2) document, not modified
+        operations: (method, path template) pairs to keep, every operation when omitted
+
+    Returns:
+        A new document sharing unmodified sub-trees with spec, treat it as read-only
+    """
+    paths = spec.get("paths") or {}
+    if operations is None:
+        selected = {template: [method for method in HTTP_METHODS if method in path_item] for template, path_item in paths.items() if isinstance(path_item, dict)}
+    else:
+        selected = {}
+        for method, template in operations:
+            if method.lower() in (paths.get(template) or {}):
+                selected.setdefault(template, []).append(method.lower())
+
+    sliced = {key: value for key, value in spec.items() if key not in COMPONENT_SECTIONS and key != "paths"}
+    sliced["paths"] = {}
+    for template, methods in selected.items():
+        path_item = paths[template]
+        # Keep path level fields such as shared parameters, drop the other operations. Refs
+        # into other paths are inlined, the slice may not contain what they point to
+        sliced["paths"][template] = inline_refs(spec, {
+            key: value for key, value in path_item.items()
+            if key not in HTTP_METHODS or key in methods
+        })
+
+    # Whole components are copied over, so refs into a part of one resolve too
+    for component in ref_closure(spec, sliced):
+        _set_pointer(sliced, _pointer_parts(component), inline_refs(spec, resolve_ref(spec, component)))
+
+    # Security schemes are referenced by name, not by $ref
+    security_schemes = (spec.get("components") or {}).get("securitySchemes")
+    if security_schemes:
+        sliced.setdefault("components", {})["securitySchemes"] = security_schemes
+    if "securityDefinitions" in spec:
+        sliced["securityDefinitions"] = spec["securityDefinitions"]
+
+    if isinstance(spec.get("tags"), list):
+        used_tags = {tag for path_item in sliced["paths"].values() for method in HTTP_METHODS for tag in (path_item.get(method) or {}).get("tags", [])}
+        sliced["tags"] = [tag for tag in spec["tags"] if isinstance(tag, dict) and tag.get("name") in used_tags]
+    return sliced
+
+
+def dump_compact(document: Any) -> str:
+    """JSON without insignificant whitespace, for prompts"""
+    return json.dumps(document, separators=(",", ":"), ensure_ascii=False)
+
+
+def shard_operations(spec: Dict[str, Any], max_operations: int) -> List[Tuple[str, List[Operation]]]:
+    """
+    Split the operations of a spec into named shards for independent generation.
+
+    Operations are grouped by their first tag, or by the first path segment when untagged,
+    and groups larger than max_operations are split into numbered parts.
+
+    Returns:
+        (shard name, operations) pairs in spec order
+    """
+    groups: Dict[str, List[Operation]] = {}
+    for template, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        for method in HTTP_METHODS:
+            operation = path_item.get(method)
+            if not isinstance(operation, dict):
+                continue
+            tags = operation.get("tags")
+            name = str(tags[0]) if tags else "/" + template.strip("/").split("/")[0]
+            groups.setdefault(name, []).append((method, template))
+
+    max_operations = max(1, max_operations)
+    shards = []
+    for name, operations in groups.items():
+        parts = [operations[i:i + max_operations] for i in range(0, len(operations), max_operations)]
+        for number, part in enumerate(parts, 1):
+            shards.append((name if len(parts) == 1 else f"{name} ({number})", part))
+    return shards
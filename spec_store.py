@@ -0,0 +1,129 @@
+"""
+Parse-once store of OpenAPI specs keyed by content digest: parsed document, validation
+verdict and compact prompt text.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import weakref
+from typing import Any, Dict, Iterable, Optional
+import aiofiles
+from pydantic import BaseModel
+from caching import TTLCache
+from spec_slicing import Operation, dump_compact, slice_spec
+from utils import validate_openapi_document
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+SPEC_STORE_SIZE = int(os.getenv("SPEC_STORE_SIZE", "32"))
+SPEC_STORE_TTL = float(os.getenv("SPEC_STORE_TTL", "3600"))
+SPEC_STORE_MAX_BYTES = int(os.getenv("SPEC_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class SpecArtifact(BaseModel):
+    """A parsed OpenAPI spec with its validation verdict, shared between callers and read-only"""
+    sha256: str
+    spec: Optional[Any]  # None when the file is not valid JSON
+    validation: Dict[str, Any]  # status, result and message as returned by validate_openapi_document
+    prompt_text: str  # Compact serialisation of every operation and the components they reference
+    size: int  # Approximate memory footprint in bytes
+
+    @property
+    def is_valid(self) -> bool:
+        return self.validation["status"] == "success"
+
+
+spec_store = TTLCache("spec", maxsize=SPEC_STORE_SIZE, ttl=SPEC_STORE_TTL, max_bytes=SPEC_STORE_MAX_BYTES, sizeof=lambda artifact: artifact.size)
+
+# One lock per digest so concurrent runs on the same spec parse and validate it only once
+_build_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _compact_spec_text(spec: Any) -> str:
+    # A spec slicing cannot handle is still valid, it goes into the prompts whole
+    if not isinstance(spec, dict):
+        return dump_compact(spec)
+    try:
+        return dump_compact(slice_spec(spec))
+    except Exception as e:
+        logger.warning(f"Could not slice the OpenAPI spec, using it whole: {e!r}")
+        return dump_compact(spec)
+
+
+def build_spec_artifact(raw: bytes, sha256: str) -> SpecArtifact:
+    """Parse, validate and serialise a spec. CPU bound, run it off the event loop"""
+    try:
+        spec = json.loads(raw)
+    except ValueError as e:
+        message = f"Invalid YAML/JSON format: {e}"
+        logger.error(message)
+        return SpecArtifact(
+            sha256=sha256,
+            spec=None,
+            validation={"status": "error", "result": "invalid", "message": message},
+            prompt_text="",
+            size=len(raw),
+        )
+
+    prompt_text = _compact_spec_text(spec)
+    return SpecArtifact(
+        sha256=sha256,
+        spec=spec,
+        validation=validate_openapi_document(spec),
+        prompt_text=prompt_text,
+        # The parsed document takes roughly twice the memory of its compact text
+        size=len(raw) + 2 * len(prompt_text),
+    )
+
+
+async def load_spec(spec_path: str) -> SpecArtifact:
+    """
+    Return the artifact for the spec file at spec_path, building it on first use.
+
+    Args:
+        spec_path: Local path of the OpenAPI spec JSON file
+
+    Returns:
+        The SpecArtifact of the file content, shared with every other caller of the same spec
+    """
+    async with aiofiles.open(spec_path, 'rb') as f:
+        raw = await f.read()
+    sha256 = hashlib.sha256(raw).hexdigest()
+
+    lock = _build_locks.setdefault(sha256, asyncio.Lock())
+    async with lock:
+        artifact = spec_store.get(sha256)
+        if artifact is not None:
+            logger.info(f"Using stored OpenAPI spec {sha256[:12]} for {spec_path}")
+            return artifact
+
+        artifact = await asyncio.to_thread(build_spec_artifact, raw, sha256)
+        spec_store.set(sha256, artifact)
+        logger.info(f"Stored OpenAPI spec {sha256[:12]} from {spec_path} (valid: {artifact.is_valid})")
+        return artifact
+
+
+def spec_prompt_text(artifact: SpecArtifact, operations: Optional[Iterable[Operation]] = None) -> str:
+    """
+    The spec text for a prompt about the given operations, the whole (compacted) spec when
+    no operations are given or none of them is found in the spec.
+    """
+    operations = list(operations or [])
+    if not operations or not isinstance(artifact.spec, dict):
+        return artifact.prompt_text
+
+    try:
+        sliced = slice_spec(artifact.spec, operations)
+    except Exception as e:
+        logger.warning(f"Could not slice OpenAPI spec {artifact.sha256[:12]}, using it whole: {e!r}")
+        return artifact.prompt_text
+    if not sliced["paths"]:
+        return artifact.prompt_text
+
+    text = dump_compact(sliced)
+    logger.info(f"Sliced OpenAPI spec {artifact.sha256[:12]} to {len(sliced['paths'])} paths: {len(text)} of {len(artifact.prompt_text)} characters")
+    return text
@@ -0,0 +1,146 @@
+"""
+Helpers for inspecting the SQL the data search agent generates.
+"""
+
+import re
+from typing import List, Tuple
+
+_QUOTES = ("'", '"', "`")
+
+# Functions whose result changes between executions, queries using them are never cached
+NON_DETERMINISTIC_PATTERN = re.compile(
+    r"\b(NOW|RAND|RANDOM|UUID|UUID_SHORT|SYSDATE|CURDATE|CURTIME|CURRENT_DATE|CURRENT_TIME|"
+    r"CURRENT_TIMESTAMP|LOCALTIME|LOCALTIMESTAMP|UNIX_TIMESTAMP|UTC_DATE|UTC_TIME|UTC_TIMESTAMP|"
+    r"NEWID|GETDATE|SYSDATETIME|GEN_RANDOM_UUID|CONNECTION_ID|LAST_INSERT_ID)\b",
+    re.IGNORECASE,
+)
+
+READ_ONLY_STATEMENTS = ("SELECT", "WITH", "SHOW")
+
+# Keywords that modify data or schema anywhere in a statement, e.g. WITH ... DELETE (the REPLACE() string function is fine)
+DATA_MODIFYING_PATTERN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TRUNCATE)\b|\bREPLACE\b(?!\s*\()",
+    re.IGNORECASE,
+)
+
+
+def _split_literals(query: str) -> List[str]:
+    """
+    Split a query into alternating code and quoted-literal segments, so transformations
+    can be applied to the code only. Even indexes are code, odd indexes are literals.
+    """
+    segments = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(query):
+        char = query[i]
+        if quote is None:
+            if char in _QUOTES:
+                segments.append("".join(current))
+                current = [char]
+                quote = char
+            else:
+                current.append(char)
+        else:
+            current.append(char)
+            if char == "\\" and i + 1 < len(query):
+                current.append(query[i + 1])
+                i += 1
+            elif char == quote:
+                # A doubled quote is an escaped quote inside the literal
+                if i + 1 < len(query) and query[i + 1] == quote:
+                    current.append(query[i + 1])
+                    i += 1
+                else:
+                    segments.append("".join(current))
+                    current = []
+                    quote = None
+        i += 1
+    segments.append("".join(current))
+    if len(segments) % 2 == 0:
+        # Unterminated literal, keep it attached to the last code segment
+        literal = segments.pop()
+        segments[-1] += literal
+    return segments
+
+
+def strip_literals(query: str) -> str:
+    """Return the query with every quoted literal replaced by empty quotes"""
+    segments = _split_literals(query)
+    return "".join(segment if i % 2 == 0 else "''" for i, segment in enumerate(segments))
+
+
+def strip_comments(query: str) -> str:
+    """Remove -- , # and /* */ comments that are outside quoted literals"""
+    segments = _split_literals(query)
+    return "".join(
+        re.sub(r"/\*.*?\*/|--[^\n]*|#[^\n]*", " ", segment, flags=re.DOTALL) if i % 2 == 0 else segment
+        for i, segment in enumerate(segments)
+    )
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a query so whitespace-equivalent statements compare equal: runs of
+    whitespace outside literals collapse to one space and trailing semicolons are dropped.
+    """
+    segments = _split_literals(query.strip())
+    normalized = "".join(
+        re.sub(r"\s+", " ", segment) if i % 2 == 0 else segment
+        for i, segment in enumerate(segments)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+def statement_type(query: str) -> str:
+    """Upper-cased first keyword of the query, e.g. SELECT"""
+    match = re.match(r"\s*\(?\s*([A-Za-z]+)", query)
+    return match.group(1).upper() if match else ""
+
+
+def is_read_only_query(query: str) -> bool:
+    """True for single plain SELECT/WITH/SHOW statements that cannot modify or lock data"""
+    if statement_type(query) not in READ_ONLY_STATEMENTS:
+        return False
+    code = strip_literals(normalize_sql(strip_comments(query)))
+    # A second statement after a semicolon could do anything
+    if ";" in code or DATA_MODIFYING_PATTERN.search(code):
+        return False
+    # SELECT ... INTO OUTFILE and locking reads have side effects
+    return not re.search(r"\bINTO\b|\bFOR\s+UPDATE\b|\bFOR\s+SHARE\b|\bLOCK\s+IN\b", code, re.IGNORECASE)
+
+
+def is_deterministic_query(query: str) -> bool:
+    """False when the query calls a function whose result changes between executions"""
+    return NON_DETERMINISTIC_PATTERN.search(strip_literals(query)) is None
+
+
+def is_cacheable_query(query: str) -> bool:
+    """Whether the result of query can be served from the query cache"""
+    return is_read_only_query(query) and is_deterministic_query(query)
+
+
+_TRAILING_LIMIT_PATTERN = re.compile(
+    r"(\bLIMIT\s+\d+(\s*(,|\bOFFSET\b)\s*\d+)?|\bFETCH\s+(FIRST|NEXT)\s+\d+\s+ROWS?\s+ONLY)\s*$",
+    re.IGNORECASE,
+)
+
+
+def has_row_limit(query: str) -> bool:
+    """True when the outermost statement already ends with a LIMIT or FETCH FIRST clause"""
+    code = normalize_sql(strip_literals(query))
+    return bool(_TRAILING_LIMIT_PATTERN.search(code) or re.match(r"SELECT\s+(DISTINCT\s+)?TOP\s+\d+", code, re.IGNORECASE))
+
+
+def ensure_row_limit(query: str, limit: int) -> Tuple[str, bool]:
+    """
+    Append LIMIT to SELECT/WITH queries that do not already limit their rows.
+
+    Returns:
+        The query to execute and whether a LIMIT was injected
+    """
+    query = strip_comments(query)
+    if statement_type(query) not in ("SELECT", "WITH") or has_row_limit(query):
+        return query, False
+    return f"{normalize_sql(query)} LIMIT {limit}", True
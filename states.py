@@ -20,6 +20,7 @@ class AgentState(TypedDict):
     generated_collection_fpath: Optional[str]  # Path to save generated Postman collection JSON file
     status: Optional[str] = None
     reasoning: Optional[str] = None
+    use_query_cache: Optional[bool] = True  # False bypasses the execute_sql result cache for this run
 
 class DataSearchState(MessagesState):
     """Input state for the data search agent."""
@@ -28,6 +29,8 @@ class DataSearchState(MessagesState):
     status: str = "searching"
     reasoning: str = ""
     last_query_result: Optional[Dict] = None
+    use_query_cache: bool = True
+    turns: int = 0  # LLM turns taken so far, capped by DATA_AGENT_MAX_TURNS
 
 
 # ==== STRUCTURED OUTPUT SCHEMAS ====
@@ -0,0 +1,221 @@
+"""
+Content-deduplicating storage backends (GCS or local directory) for generated collections.
+"""
+
+import asyncio
+import base64
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+# ===== CONFIGURATION =====
+# "gcs" or "local"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs").lower()
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", os.path.join("artifacts", "storage"))
+# Files from this size on are uploaded with resumable uploads in chunks of GCS_CHUNK_SIZE (a multiple of 256 KiB)
+GCS_RESUMABLE_THRESHOLD = int(os.getenv("GCS_RESUMABLE_THRESHOLD", str(8 * 1024 * 1024)))
+GCS_CHUNK_SIZE = int(os.getenv("GCS_CHUNK_SIZE", str(8 * 1024 * 1024)))
+GCS_UPLOAD_TIMEOUT = float(os.getenv("GCS_UPLOAD_TIMEOUT", "120"))
+
+
+def file_md5(path: str) -> str:
+    """Base64 MD5 digest of a file, as GCS reports it in md5_hash"""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+class StorageBackend(ABC):
+    """Content-deduplicating object store, subclasses implement the object operations"""
+
+    name = "storage"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # prefix -> {md5: object name} of the objects known to be stored under it
+        self._known: Dict[str, Dict[str, str]] = {}
+        self.uploads = 0
+        self.skipped = 0
+        self.bytes_uploaded = 0
+
+    # Object operations
+    @abstractmethod
+    def uri(self, object_name: str) -> str:
+        """URI of a stored object"""
+
+    @abstractmethod
+    def _list(self, prefix: str) -> Iterable[Tuple[str, Optional[str]]]:
+        """(object name, base64 MD5) of the objects under prefix"""
+
+    @abstractmethod
+    def _md5(self, object_name: str) -> Optional[str]:
+        """Base64 MD5 of a stored object, None when it does not exist"""
+
+    @abstractmethod
+    def _put(self, file_path: str, object_name: str, content_type: str, content_encoding: Optional[str], size: int):
+        """Store a file as object_name"""
+
+    def _known_objects(self, prefix: str) -> Dict[str, str]:
+        with self._lock:
+            known = self._known.get(prefix)
+        if known is None:
+            listed = {md5: object_name for object_name, md5 in self._list(prefix) if md5}
+            with self._lock:
+                known = self._known.setdefault(prefix, listed)
+        return known
+
+    def upload(self, file_path: str, object_name: str, content_type: str = "application/json",
+               content_encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a file as object_name, unless an identical object is already stored under the
+        same prefix.
+
+        Returns:
+            uri of the stored object (the existing one when skipped), skipped, md5 and size
+        """
+        md5 = file_md5(file_path)
+        size = os.path.getsize(file_path)
+        prefix = object_name.rsplit("/", 1)[0] + "/" if "/" in object_name else ""
+        known = self._known_objects(prefix)
+
+        existing = known.get(md5)
+        # Confirm the object is still there with the same content before reusing it
+        if existing is not None and self._md5(existing) == md5:
+            with self._lock:
+                self.skipped += 1
+            logger.info(f"{object_name} is identical to the stored {existing}, skipping the upload")
+            return {"uri": self.uri(existing), "skipped": True, "md5": md5, "size": size}
+
+        self._put(file_path, object_name, content_type, content_encoding, size)
+        with self._lock:
+            known[md5] = object_name
+            self.uploads += 1
+            self.bytes_uploaded += size
+        return {"uri": self.uri(object_name), "skipped": False, "md5": md5, "size": size}
+
+    async def aupload(self, file_path: str, object_name: str, content_type: str = "application/json",
+                      content_encoding: Optional[str] = None) -> Dict[str, Any]:
+        """upload() in a worker thread, the storage clients are synchronous"""
+        return await asyncio.to_thread(self.upload, file_path, object_name, content_type, content_encoding)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "uploads": self.uploads,
+                "skipped": self.skipped,
+                "bytes_uploaded": self.bytes_uploaded,
+                "prefixes_indexed": len(self._known),
+            }
+
+
+class GCSBackend(StorageBackend):
+    """Google Cloud Storage bucket, one client for the life of the process"""
+
+    name = "gcs"
+
+    def __init__(self, bucket_name: Optional[str]):
+        super().__init__()
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        # Created on first use so the app starts without credentials, e.g. with STORAGE_BACKEND=local
+        with self._lock:
+            if self._bucket is None:
+                from google.cloud import storage
+                if not self.bucket_name:
+                    raise ValueError("GCS_BUCKET_NAME is not set")
+                self._bucket = storage.Client().bucket(self.bucket_name)
+            return self._bucket
+
+    def uri(self, object_name: str) -> str:
+        return f"gs://{self.bucket_name}/{object_name}"
+
+    def _list(self, prefix: str) -> Iterable[Tuple[str, Optional[str]]]:
+        for blob in self.bucket.client.list_blobs(self.bucket, prefix=prefix, fields="items(name,md5Hash),nextPageToken"):
+            yield blob.name, blob.md5_hash
+
+    def _md5(self, object_name: str) -> Optional[str]:
+        blob = self.bucket.get_blob(object_name)
+        return blob.md5_hash if blob is not None else None
+
+    def _put(self, file_path: str, object_name: str, content_type: str, content_encoding: Optional[str], size: int):
+        # A chunk size makes the client use a resumable upload, which survives transient errors mid-file
+        chunk_size = GCS_CHUNK_SIZE if size >= GCS_RESUMABLE_THRESHOLD else None
+        blob = self.bucket.blob(object_name, chunk_size=chunk_size)
+        if content_encoding:
+            blob.content_encoding = content_encoding
+        blob.upload_from_filename(file_path, content_type=content_type, checksum="md5", timeout=GCS_UPLOAD_TIMEOUT)
+
+
+class LocalBackend(StorageBackend):
+    """Objects stored as files under a directory"""
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = Path(directory)
+        # object name -> (mtime, size, md5), so unchanged files are not hashed again
+        self._digests: Dict[str, Tuple[float, int, str]] = {}
+
+    def uri(self, object_name: str) -> str:
+        return (self.directory / object_name).resolve().as_uri()
+
+    def _file_md5(self, path: Path) -> Optional[str]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = str(path)
+        cached = self._digests.get(key)
+        if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        md5 = file_md5(key)
+        self._digests[key] = (stat.st_mtime, stat.st_size, md5)
+        return md5
+
+    def _list(self, prefix: str) -> Iterable[Tuple[str, Optional[str]]]:
+        directory = self.directory / prefix
+        if not directory.is_dir():
+            return
+        for path in directory.iterdir():
+            if path.is_file() and not path.name.startswith("."):
+                yield f"{prefix}{path.name}", self._file_md5(path)
+
+    def _md5(self, object_name: str) -> Optional[str]:
+        return self._file_md5(self.directory / object_name)
+
+    def _put(self, file_path: str, object_name: str, content_type: str, content_encoding: Optional[str], size: int):
+        destination = self.directory / object_name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(file_path, temp_path)
+            os.replace(temp_path, destination)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+
+def create_storage_backend(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    if kind == "local":
+        return LocalBackend(STORAGE_LOCAL_DIR)
+    if kind == "gcs":
+        return GCSBackend(os.getenv("GCS_BUCKET_NAME"))
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r}, expected 'gcs' or 'local'")
+
+
+storage_backend = create_storage_backend()
@@ -1,5 +1,6 @@
 import requests
 import json
+import time
 # In the TFL JourneyResults endpoint, when the mode is set to an invalid value such as spaceship, the endpoint should return a 400 or 404 response.
 # In the TFL JourneyResults endpoint, if the journey is from a station in London that accepts oyster cards to a station in London that does not accept oyster cards, when the mode is set to tube, the endpoint should return a 400 response.
 
@@ -30,11 +31,21 @@ if __name__ == "__main__":
     }
     
     try:
-        url = "http://127.0.0.1:8000/run-testing-agent/"
-        # Add timeout for better error handling with remote endpoints
-        response = requests.post(url, json=test_data, timeout=600)
+        base_url = "http://127.0.0.1:8000"
+        # The run is queued and a job id is returned straight away
+        response = requests.post(f"{base_url}/run-testing-agent/", json=test_data, timeout=30)
         print(f"Status: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
+
+        # Poll the job until it has finished
+        job_url = f"{base_url}{response.json()['status_url']}"
+        while True:
+            job = requests.get(job_url, timeout=30).json()
+            print(f"Job status: {job['status']} (node: {job['current_node']})")
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(5)
+        print(f"Result: {json.dumps(job, indent=2)}")
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to the server at http://127.0.0.1:8000")
         print("Make sure the FastAPI server is running with: uvicorn main:app --reload")
@@ -4,28 +4,27 @@ load_dotenv()
 from states import AgentState, GetRequirements
 from prompts import get_requirements_prompt
 from database_tools import list_tables_tool
-from langchain.chat_models import init_chat_model
+from model_registry import get_structured_model
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, START, END
-from data_agent import data_search_agent
-import time 
+from data_agent import data_search_agent, DATA_AGENT_RECURSION_LIMIT
+from lookup_artifacts import lookup_record, write_lookup_artifact
 import os
+import asyncio
 from logging_utils import setup_logging
 
-model = init_chat_model(
-    model="gpt-4o-mini",
-    model_provider="openai", 
-    temperature=0.0
-)
-
 logger = setup_logging(__name__)
 
+# ===== CONFIGURATION =====
+# Maximum number of data search sub-agents running at the same time, 1 runs the lookups sequentially
+LOOKUP_CONCURRENCY = int(os.getenv("LOOKUP_CONCURRENCY", "4"))
+
 # ===== WORKFLOW NODES =====
-def get_requirements(state: AgentState):
-    #setup structured output model 
-    structured_output_model = model.with_structured_output(GetRequirements)
+async def get_requirements(state: AgentState):
+    #structured output model, bound once per process
+    structured_output_model = get_structured_model("get_requirements", GetRequirements)
 
-    response = structured_output_model.invoke([
+    response = await structured_output_model.ainvoke([
         HumanMessage(content=get_requirements_prompt.format(
             test_data_scenario=state["test_data_scenario"], 
         ))
@@ -37,11 +36,11 @@ def get_requirements(state: AgentState):
         "lookup_requests": response.data_to_lookup
     }
 
-def list_tables(state: AgentState):
+async def list_tables(state: AgentState):
     """Node that retrieves available database tables with descriptions using the MCP tool"""
     try:
         # Call the list_tables_tool
-        result = list_tables_tool._run()
+        result = await list_tables_tool.ainvoke({})
         
         if result.get("status") == "success":
             # Get tables as list of (name, description) tuples
@@ -62,55 +61,50 @@ def list_tables(state: AgentState):
             "tables": []
         }
 
-def run_lookups(state:AgentState):
-    results_text = []
-    failed_lookups = []
-    for lookup_query in state["lookup_requests"]:
-        initial_state = {
-            "messages": [],  # Empty list is fine - no history needed
-            "lookup_query": lookup_query,
-            "all_tables": state["tables"],
-            "status": "searching",
-            "reasoning": "",
-            "last_query_result": None
-        }
+async def run_lookup(lookup_query: str, tables, semaphore: asyncio.Semaphore, use_query_cache: bool = True):
+    """
+    Runs one data search sub-agent. Lookups are read-only and independent, so a failure
+    is returned as a failed result instead of being raised and cancelling the others.
+    """
+    initial_state = {
+        "messages": [],  # Empty list is fine - no history needed
+        "lookup_query": lookup_query,
+        "all_tables": tables,
+        "status": "searching",
+        "reasoning": "",
+        "last_query_result": None,
+        "use_query_cache": use_query_cache,
+        "turns": 0
+    }
 
-        # Invoke the agent
-        result = data_search_agent.invoke(initial_state)
-        if result["status"] == "found":
-            # Format: Query on one line, data below
-            results_text.append(f"{lookup_query}:")
-            
-            # Add the data (assuming it's a list of dicts)
-            data = result["last_query_result"]["data"]
-            if data:
-                for item in data:
-                    # Format each data item as a simple string
-                    results_text.append(f"  {item}")
-            else:
-                results_text.append("  No data returned")
-            
-            results_text.append("")  # Empty line between lookups
-            
-        else:
-            # Track failures separately
-            failed_lookups.append(f"{lookup_query}: {result['reasoning']}")
-    
-    # Combine everything
-    final_text = "\n".join(results_text)
-    
-    if failed_lookups:
-        final_text += "\n\nFAILED LOOKUPS:\n"
-        final_text += "\n".join(failed_lookups)
-    
-    filename = f"lookups_result_{int(time.time())}.txt"
-    os.makedirs("./artifacts", exist_ok=True)
-
-    path = f"./artifacts/{filename}"
-    
-    # Save the file
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(final_text)
+    async with semaphore:
+        try:
+            return await data_search_agent.ainvoke(
+                initial_state, config={"recursion_limit": DATA_AGENT_RECURSION_LIMIT}
+            )
+        except Exception as e:
+            logger.error(f"Lookup '{lookup_query}' raised an exception: {e}")
+            return {
+                "status": "failed",
+                "reasoning": f"Lookup raised an exception: {e}",
+                "last_query_result": None
+            }
+
+async def run_lookups(state:AgentState):
+    lookup_requests = state.get("lookup_requests") or []
+
+    # Fan out the sub-agents, gather keeps the results in the order of lookup_requests
+    semaphore = asyncio.Semaphore(max(1, LOOKUP_CONCURRENCY))
+    results = await asyncio.gather(*[
+        run_lookup(lookup_query, state["tables"], semaphore, state.get("use_query_cache", True))
+        for lookup_query in lookup_requests
+    ])
+
+    # One NDJSON record per lookup, the prompt view is rendered from it by enhance_with_data_collection
+    records = [lookup_record(lookup_query, result) for lookup_query, result in zip(lookup_requests, results)]
+    path = await write_lookup_artifact(records)
+    failed = sum(1 for record in records if record["status"] != "found")
+    logger.info(f"Saved {len(records)} lookups ({failed} failed) to {path}")
 
     return {"data_fpath":path}
 
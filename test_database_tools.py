@@ -3,7 +3,7 @@
 Quick test script for MCP tools
 """
 import asyncio
-from database_tools import list_tables_tool, describe_table_tool, execute_sql_tool
+from database_tools import list_tables_tool, describe_table_tool, execute_sql_tool, mcp_loop, mcp_sessions
 
 async def test_tools():
     print("🔧 Testing MCP Tools...\n")
@@ -84,6 +84,8 @@ async def test_tools():
     except Exception as e:
         print(f"❌ Exception: {e}")
 
+    await mcp_loop.arun(mcp_sessions.close())
+
 def main():
     """Run the tests"""
     print("🚀 Starting MCP Tools Test\n")
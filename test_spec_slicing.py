@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Quick checks of OpenAPI spec slicing
+"""
+from spec_slicing import slice_spec
+from spec_store import build_spec_artifact
+
+
+def _spec():
+    parameter = {"name": "id", "in": "query", "schema": {"$ref": "#/components/schemas/Id"}}
+    return {
+        "openapi": "3.0.0",
+        "info": {"title": "t", "version": "1"},
+        "paths": {
+            "/a": {"get": {"parameters": [parameter], "responses": {"200": {"description": "ok"}}}},
+            # Bundlers point shared parts at their first use
+            "/b": {"get": {"parameters": [{"$ref": "#/paths/~1a/get/parameters/0"}], "responses": {"200": {"description": "ok"}}}},
+        },
+        "components": {"schemas": {
+            "Id": {"type": "string"},
+            "Pet": {
+                "oneOf": [{"$ref": "#/components/schemas/Cat"}],
+                "discriminator": {"propertyName": "kind", "mapping": {"dog": "#/components/schemas/Dog", "fish": "Fish"}},
+            },
+            "Cat": {"type": "object"}, "Dog": {"type": "object"}, "Fish": {"type": "object"}, "Unused": {"type": "object"},
+        }},
+    }
+
+
+def test_refs_into_paths_are_inlined():
+    spec = _spec()
+    both = slice_spec(spec)
+    assert both["paths"]["/b"]["get"]["parameters"] == [spec["paths"]["/a"]["get"]["parameters"][0]]
+    assert set(both["components"]["schemas"]) == {"Id"}
+
+    only_b = slice_spec(spec, [("get", "/b")])
+    # /a is not grafted into the slice as a broken operation
+    assert list(only_b["paths"]) == ["/b"]
+    assert only_b["paths"]["/b"]["get"]["parameters"][0]["name"] == "id"
+    assert set(only_b["components"]["schemas"]) == {"Id"}
+    # The original spec is not modified
+    assert spec == _spec()
+
+
+def test_discriminator_mapping_targets_are_kept():
+    spec = _spec()
+    spec["paths"]["/a"]["get"]["responses"]["200"]["content"] = {"application/json": {"schema": {"$ref": "#/components/schemas/Pet"}}}
+    assert set(slice_spec(spec, [("get", "/a")])["components"]["schemas"]) == {"Id", "Pet", "Cat", "Dog", "Fish"}
+
+
+def test_spec_with_refs_into_paths_loads():
+    import json
+    artifact = build_spec_artifact(json.dumps(_spec()).encode(), "0" * 64)
+    assert artifact.is_valid
+    assert '"/b"' in artifact.prompt_text
+
+
+if __name__ == "__main__":
+    test_refs_into_paths_are_inlined()
+    test_discriminator_mapping_targets_are_kept()
+    test_spec_with_refs_into_paths_loads()
+    print("✅ spec_slicing checks passed")
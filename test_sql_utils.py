@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Quick checks of the query cache eligibility rules in sql_utils
+"""
+from sql_utils import is_cacheable_query, is_read_only_query
+
+
+def test_read_only_queries_are_cacheable():
+    assert is_cacheable_query("SELECT * FROM stops WHERE id = 1")
+    assert is_cacheable_query("SELECT * FROM stops;")
+    assert is_cacheable_query("WITH a AS (SELECT 1) SELECT * FROM a")
+    assert is_cacheable_query("SELECT REPLACE(name, ' ', '_') FROM stops")
+    # Keywords and semicolons inside literals or comments are data, not statements
+    assert is_cacheable_query("SELECT * FROM stops WHERE name = 'Drop; delete'")
+    assert is_cacheable_query("SELECT update_time FROM stops -- not an UPDATE;")
+
+
+def test_data_modifying_queries_are_not_cacheable():
+    assert not is_read_only_query("WITH a AS (SELECT 1) DELETE FROM t")
+    assert not is_read_only_query("SELECT 1; DROP TABLE x")
+    assert not is_read_only_query("SELECT 1;\nSELECT 2")
+    assert not is_read_only_query("WITH a AS (UPDATE t SET x = 1 RETURNING *) SELECT * FROM a")
+    assert not is_read_only_query("SELECT * INTO backup FROM t")
+    assert not is_read_only_query("SELECT * FROM t FOR UPDATE")
+    assert not is_cacheable_query("INSERT INTO t VALUES (1)")
+    assert not is_cacheable_query("SELECT NOW()")
+
+
+if __name__ == "__main__":
+    test_read_only_queries_are_cacheable()
+    test_data_modifying_queries_are_not_cacheable()
+    print("✅ sql_utils checks passed")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Quick checks of execute_sql result capping
+"""
+import json
+from utils import cap_rows
+
+
+def test_first_oversized_row_is_cut_not_passed_through():
+    kept, omitted, cut = cap_rows([{"id": 1, "blob": "x" * 50000}, {"id": 2, "blob": "y"}], 50, 4000)
+    assert len(kept) == 1 and omitted == 1 and cut == 1
+    assert len(json.dumps(kept[0])) <= 4000
+    assert kept[0]["id"] == 1 and kept[0]["blob"].endswith("[truncated, 50002 bytes]")
+
+
+def test_oversized_non_ascii_value_is_cut():
+    kept, omitted, cut = cap_rows([{"name": "東京" * 3000}], 50, 4000)
+    assert len(kept) == 1 and omitted == 0 and cut == 1
+    assert len(json.dumps(kept[0])) <= 4000
+    assert kept[0]["name"].startswith("東京")
+
+
+def test_row_too_wide_to_cut_is_dropped():
+    kept, omitted, cut = cap_rows([{f"column_{i}": "v" * 10 for i in range(3000)}], 50, 1000)
+    assert kept == [] and omitted == 1 and cut == 0
+
+
+if __name__ == "__main__":
+    test_first_oversized_row_is_cut_not_passed_through()
+    test_oversized_non_ascii_value_is_cut()
+    test_row_too_wide_to_cut_is_dropped()
+    print("✅ cap_rows checks passed")
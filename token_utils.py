@@ -0,0 +1,49 @@
+"""
+Token counting with tiktoken's o200k_base encoding, or ~4 characters per token when it cannot be loaded.
+"""
+
+from functools import lru_cache
+from typing import Iterable, Optional
+from logging_utils import setup_logging
+
+logger = setup_logging(__name__)
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens from characters: {e}")
+        return None
+
+
+def tokenizer_name() -> str:
+    """Name of the tokenizer used by count_tokens"""
+    return "o200k_base" if _encoding() is not None else f"estimate ({CHARS_PER_TOKEN} chars/token)"
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Iterable) -> int:
+    """Approximate prompt tokens of a list of LangChain messages, including tool calls"""
+    total = 0
+    for message in messages:
+        # Per-message overhead of the chat format
+        total += 4
+        content = message.content
+        total += count_tokens(content if isinstance(content, str) else str(content))
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += count_tokens(f"{tool_call['name']}{tool_call['args']}")
+    return total
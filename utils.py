@@ -1,56 +1,63 @@
 import json 
+import gzip
+import io
+import os
+import uuid
+import aiofiles
 from logging_utils import setup_logging
 from datetime import datetime
+from pathlib import Path
+from contextlib import contextmanager
 from openapi_spec_validator import validate_spec
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collection_merge import merge_collection_items
 import json
 
 # Configure the module's logger
 logger = setup_logging(__name__)
 
+# ===== CONFIGURATION =====
+# Directory generated collections are written to
+COLLECTION_OUTPUT_DIR = os.getenv("COLLECTION_OUTPUT_DIR", os.path.join("artifacts", "collections"))
+# "pretty" (indent=2), "compact" (no whitespace) or "gzip" (compact, gzip compressed .json.gz)
+COLLECTION_OUTPUT_FORMAT = os.getenv("COLLECTION_OUTPUT_FORMAT", "pretty").lower()
+
+# ASYNC FILE UTILITY FUNCTIONS
+async def read_text_file(path: str) -> str:
+    """Read a text file without blocking the event loop"""
+    async with aiofiles.open(path, 'r', encoding='utf-8') as f:
+        return await f.read()
+
+
+async def read_json_file(path: str) -> Any:
+    """Read and parse a JSON file without blocking the event loop"""
+    return json.loads(await read_text_file(path))
+
+
 # SPEC VALIDATION UTILITY FUNCTIONS 
-def validate_json_spec(spec_path: str) -> Dict:
-    spec = None
+def validate_openapi_document(spec_json: Any) -> Dict:
+    """
+    Validate a parsed OpenAPI document. CPU bound, run it off the event loop.
+
+    Returns:
+        Dict with the validation status ("success" or "error"), result ("valid" or "invalid") and message
+    """
     try:
-        if not spec_path:
-            logger.error("No OpenAPI spec URL provided in session state.")
-            return {
-                "status": "error",
-                "message": "No OpenAPI spec URL provided in session state.",
-                "validation_status": "failed",
-            }
-            
-        # First validate it's proper JSON
-        with open(spec_path, 'r') as f:
-            spec_json = json.load(f)
-    
-        # Validate the OpenAPI spec
         validate_spec(spec_json)
-        validation_status = "success"
-        validation_result = "valid"
-        validation_message = "OpenAPI specification is valid."
-        spec = spec_json
-
-    except json.JSONDecodeError as e:
-        validation_status =  "error",
-        validation_result = "valid"
-        validation_message = f"Invalid YAML/JSON format: {e}",
-        logger.error(validation_message)
-    
+        return {
+            "status": "success",
+            "result": "valid",
+            "message": "OpenAPI specification is valid."
+        }
     except Exception as e:
-        validation_status =  "error",
-        validation_result = "valid"
-        validation_message = f"OpenAPI specification is invalid: {e}",
+        # jsonschema errors render the whole schema in str(e), message is the useful part
+        validation_message = f"OpenAPI specification is invalid: {getattr(e, 'message', None) or e}"
         logger.error(validation_message)
-    
-    validation_json = {
-        "status": validation_status, 
-        "result": validation_result, 
-        "message": validation_message,
-        "spec": spec
-    }
-    
-    return validation_json
+        return {
+            "status": "error",
+            "result": "invalid",
+            "message": validation_message
+        }
 
 
 # CREATE POSTMAN COLLECTION UTILITY FUNCTIONS 
@@ -114,6 +121,56 @@ def attempt_json_repair(text):
         return None
 
 
+def merge_shard_collections(name: str, shards: List[Tuple[str, Any]]) -> Dict:
+    """
+    Combine collections generated for separate parts of a spec into one Postman collection.
+
+    Args:
+        name: Name of the merged collection
+        shards: (folder name, generated collection or list of items) pairs, one folder per shard
+
+    Returns:
+        dict: A Postman v2.1.0 collection with one folder per shard and the union of the shard variables.
+        A shard's collection level scripts and description move to its folder, so its requests
+        run with the same pre-request and test scripts as in a single generated collection.
+    """
+    folders = []
+    variables = {}
+    auth = None
+    for folder_name, collection in shards:
+        folder: Dict[str, Any] = {"name": folder_name}
+        if isinstance(collection, list):
+            items = collection
+        elif isinstance(collection, dict):
+            items = collection.get("item") or []
+            for variable in collection.get("variable") or []:
+                if isinstance(variable, dict) and "key" in variable:
+                    variables.setdefault(variable["key"], variable)
+            auth = auth or collection.get("auth")
+            info = collection.get("info") if isinstance(collection.get("info"), dict) else {}
+            if info.get("description"):
+                folder["description"] = info["description"]
+            if collection.get("event"):
+                folder["event"] = collection["event"]
+        else:
+            logger.warning(f"Skipping shard '{folder_name}', expected a collection or a list of items, got {type(collection).__name__}")
+            continue
+        folder["item"] = items
+        folders.append(folder)
+
+    merged = {
+        "info": {
+            "name": name,
+            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
+        },
+        "item": folders,
+        "variable": list(variables.values())
+    }
+    if auth:
+        merged["auth"] = auth
+    return merged
+
+
 # ENHANCE POSTMAN COLLECTION UTILITY FUNCTIONS 
 def get_last_test_case_from_collection(collection_path: str):
     """
@@ -193,14 +250,157 @@ def _extract_rows(res: Any) -> List[Dict[str, Any]]:
     return rows
 
 
+TRUNCATED_CELL_MARKER = "... [truncated, {size} bytes]"
+
+
+def _cut_text(text: str, marker: str, max_bytes: int) -> str:
+    """The longest prefix of text that, with marker appended, serialises to at most max_bytes"""
+    # Serialised size is measured the way cap_rows measures it, escapes such as \uXXXX included
+    low, high = 0, min(len(text), max_bytes)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(json.dumps(text[:middle] + marker)) <= max_bytes:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + marker
+
+
+def _shrink_row(row: Dict[str, Any], max_bytes: int) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Cut the oversized cell values of a row that alone is over max_bytes, each cell getting
+    an equal share of the budget.
+
+    Returns:
+        The row with its oversized values cut and marked (None when even that does not
+        fit) and the number of values cut
+    """
+    # Keys, quotes and separators take their share first
+    overhead = len(json.dumps({column: "" for column in row}, default=str)) - 2 * len(row)
+    cell_budget = max(max_bytes - overhead, 0) // max(len(row), 1)
+    shrunk = {}
+    cut = 0
+    for column, value in row.items():
+        size = len(json.dumps(value, default=str))
+        if size <= cell_budget:
+            shrunk[column] = value
+            continue
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        shrunk[column] = _cut_text(text, TRUNCATED_CELL_MARKER.format(size=size), cell_budget)
+        cut += 1
+    if len(json.dumps(shrunk, default=str)) > max_bytes:
+        return None, 0
+    return shrunk, cut
+
+
+def cap_rows(rows: List[Dict[str, Any]], max_rows: int, max_bytes: int) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Keep the leading rows that fit within both a row and a serialized-size budget. A
+    first row that alone is over the size budget has its oversized values cut, and is
+    dropped when that is not enough, so no result ever exceeds max_bytes.
+
+    Returns:
+        The kept rows, the number of rows that were dropped and the number of cell values cut
+    """
+    kept = []
+    used_bytes = 0
+    cut = 0
+    for row in rows[:max_rows]:
+        size = len(json.dumps(row, default=str))
+        if used_bytes + size > max_bytes:
+            if not kept and isinstance(row, dict):
+                row, cut = _shrink_row(row, max_bytes)
+                if row is not None:
+                    kept.append(row)
+            break
+        used_bytes += size
+        kept.append(row)
+    return kept, len(rows) - len(kept), cut
+
+
 # SAVING UTILITY FUNCTIONS 
+def _write_json_value(f, value: Any, pretty: bool, level: int):
+    """Write one value, indented as if nested level deep in an indent=2 document"""
+    if pretty:
+        # JSON strings cannot contain raw newlines, so re-indenting the lines is safe. ASCII
+        # escaped like json.dump(indent=2), so pretty files are byte-identical to it
+        f.write(json.dumps(value, indent=2).replace("\n", "\n" + "  " * level))
+    else:
+        f.write(json.dumps(value, separators=(",", ":"), ensure_ascii=False))
+
+
+@contextmanager
+def _open_gzip_text(path: str):
+    """
+    Text stream writing gzip to path, with no file name or modification time in the header,
+    so identical content always gives identical bytes (and MD5) for upload deduplication
+    """
+    with open(path, "wb") as raw, gzip.GzipFile(filename="", mode="wb", compresslevel=6, fileobj=raw, mtime=0) as compressed:
+        with io.TextIOWrapper(compressed, encoding="utf-8") as f:
+            yield f
+
+
+def write_collection_file(collection_json: Dict[str, Any], path: str, output_format: str = "pretty") -> str:
+    """
+    Stream a Postman collection to path atomically.
+
+    The top level "item" array is written one item at a time, so no serialised copy of the
+    whole collection is held in memory. The document is written to a temporary file next to
+    path and renamed over it once complete, so readers never see a partial file.
+
+    Args:
+        collection_json: The collection, not modified
+        path: Destination file
+        output_format: "pretty", "compact" or "gzip"
+
+    Returns:
+        The path written
+    """
+    pretty = output_format == "pretty"
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+
+    opener = _open_gzip_text if output_format == "gzip" else (lambda p: open(p, "w", encoding="utf-8", buffering=1024 * 1024))
+    try:
+        with opener(temp_path) as f:
+            if not collection_json:
+                f.write("{}")
+            else:
+                _write_collection_fields(f, collection_json, pretty)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def _write_collection_fields(f, collection_json: Dict[str, Any], pretty: bool):
+    newline, indent, separator = ("\n", "  ", ": ") if pretty else ("", "", ":")
+    f.write("{")
+    for position, (key, value) in enumerate(collection_json.items()):
+        f.write(("," if position else "") + newline + indent + json.dumps(key) + separator)
+        if key == "item" and isinstance(value, list) and value:
+            f.write("[")
+            for item_position, item in enumerate(value):
+                f.write(("," if item_position else "") + newline + indent * 2)
+                _write_json_value(f, item, pretty, 2)
+            f.write(newline + indent + "]")
+        else:
+            _write_json_value(f, value, pretty, 1)
+    f.write(newline + "}")
+
+
 def save_postman_collection_to_file(collection_json, mode) -> str:
     """
-    Saves the Postman collection JSON to a file in the current directory.
+    Saves the Postman collection JSON to a new file in COLLECTION_OUTPUT_DIR.
+
+    File names carry a timestamp and a random suffix, so concurrent runs never overwrite
+    each other's collections.
     
     Args:
         collection_json (dict): The Postman collection JSON object
-        tool_context (ToolContext): Provides access to session state for context
+        mode (str): "created", "enhanced" or "enhanced with data", used in the file name
     
     Returns:
         str: The file path where the collection was saved
@@ -213,43 +413,37 @@ def save_postman_collection_to_file(collection_json, mode) -> str:
         version = "enhanced"
     else:
         version = "enhanced_with_data"
-    output_filename = f"{current_time}_{version}_postman_collection.json"
+    extension = ".json.gz" if COLLECTION_OUTPUT_FORMAT == "gzip" else ".json"
+    output_filename = os.path.join(
+        COLLECTION_OUTPUT_DIR,
+        f"{current_time}_{version}_{uuid.uuid4().hex[:8]}_postman_collection{extension}"
+    )
     
     # Save the collection to file
-    with open(output_filename, 'w') as f:
-        json.dump(collection_json, f, indent=2)
-    
-    return output_filename
+    return write_collection_file(collection_json, output_filename, COLLECTION_OUTPUT_FORMAT)
 
 
 def merge_and_save_postman_collection(existing_collection: dict, new_tests: list, with_data: bool = False) -> dict:
     """
     Merge new test cases into an existing Postman collection and save to file.
+    Duplicates of existing requests are dropped or replace them, see collection_merge.
     
     Args:
-        existing_collection (dict): The full existing Postman collection JSON
+        existing_collection (dict): The full existing Postman collection JSON, not modified
         new_tests (list): Array of new test case objects to add
-        output_folder (str): Folder path where the merged collection will be saved
-        filename (str): Name of the output file (default: "enhanced_collection.json")
+        with_data (bool): Whether the tests were generated from looked-up data, for the file name
     
     Returns:
-        dict: Status and file path of the saved collection
+        dict: Status, file path and merge statistics of the saved collection
     """
     try:
-        # Create a deep copy to avoid modifying the original
-        import copy
-        merged_collection = copy.deepcopy(existing_collection)
-        
-        # Ensure the collection has an 'item' array
-        if 'item' not in merged_collection:
-            merged_collection['item'] = []
-        
-        # Add new tests to the existing collection's items
-        merged_collection['item'].extend(new_tests)
+        # Indexed merge, the original collection is left untouched
+        merged_collection, merge_stats = merge_collection_items(existing_collection, new_tests)
         
         # Update collection info if needed
-        if 'info' in merged_collection and 'name' in merged_collection['info']:
+        if isinstance(merged_collection.get('info'), dict) and 'name' in merged_collection['info']:
             # Optionally update the name to indicate it's enhanced
+            merged_collection['info'] = dict(merged_collection['info'])
             original_name = merged_collection['info']['name']
             if not original_name.endswith(' (Enhanced)'):
                 merged_collection['info']['name'] = f"{original_name} (Enhanced)"
@@ -263,9 +457,13 @@ def merge_and_save_postman_collection(existing_collection: dict, new_tests: list
         
         return {
             "status": "success",
-            "message": f"Collection enhanced with {len(new_tests)} new test cases",
+            "message": (
+                f"Collection enhanced with {merge_stats['added']} new test cases "
+                f"({merge_stats['replaced']} replaced, {merge_stats['duplicates_dropped']} duplicates dropped)"
+            ),
             "file_path": filepath,
-            "test_count": len(merged_collection.get('item', []))
+            "test_count": merge_stats['total'],
+            "merge": merge_stats
         }
         
     except Exception as e: